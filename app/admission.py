@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+
+from .config import settings
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_IN_FLIGHT = registry.gauge(
+    "admission_in_flight", "Requests holding a slot of an admission budget", ("budget",)
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge(
+    "admission_queue_depth", "Requests waiting for a slot of an admission budget", ("budget",)
+)
+ADMISSION_WAIT = registry.histogram(
+    "admission_wait_seconds", "Time admitted requests waited for a slot", ("budget",)
+)
+ADMISSION_SHED = registry.counter(
+    "admission_shed_total",
+    "Requests rejected with 503, reason=queue_full (no room to wait) or timeout (deadline passed)",
+    ("budget", "reason")
+)
+
+
+class Budget:
+    """
+    At most `concurrency` requests run at once, at most `queue_size` more wait for a
+    slot, first come first served, for up to `timeout` seconds. A released slot is
+    handed straight to the oldest waiter, so late arrivals can't overtake the queue.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def _shed(self, reason: str):
+        ADMISSION_SHED.inc(budget=self.name, reason=reason)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, retry later",
+            headers={"Retry-After": str(max(1, math.ceil(self.timeout)))}
+        )
+
+    async def acquire(self):
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            ADMISSION_IN_FLIGHT.inc(budget=self.name)
+            return
+        if len(self._waiters) >= self.queue_size:
+            self._shed("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUE_DEPTH.inc(budget=self.name)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot arrived together with the timeout or the disconnect, pass it on
+                self.release()
+            else:
+                self._dequeue(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._shed("timeout")
+        # release() already counted the slot as taken and the waiter as dequeued
+        ADMISSION_WAIT.observe(time.perf_counter() - started, budget=self.name)
+
+    def _dequeue(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+            ADMISSION_QUEUE_DEPTH.dec(budget=self.name)
+        except ValueError:
+            pass
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            ADMISSION_QUEUE_DEPTH.dec(budget=self.name)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+        ADMISSION_IN_FLIGHT.dec(budget=self.name)
+
+
+class Slot:
+    """One acquired slot of a budget, released exactly once"""
+
+    def __init__(self, budget: Budget):
+        self.budget = budget
+        # Set when a streaming response took over the slot from the route dependency
+        self.handed_off = False
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.budget.release()
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse holding the request's admission slot until the body is sent.
+    Dependencies with yield finish before the response goes out, a stream would
+    otherwise run outside every budget.
+    """
+
+    def __init__(self, request: Request, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.slot = getattr(request.state, "admission_slot", None)
+        if self.slot is not None:
+            self.slot.handed_off = True
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.slot is not None:
+                self.slot.release()
+
+
+def _parse_route_limits(value: str) -> Dict[str, Tuple[int, int]]:
+    """"name=concurrency:queue,..." into {name: (concurrency, queue)}"""
+    limits = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, numbers = item.partition("=")
+        concurrency, _, queue = numbers.partition(":")
+        limits[name.strip()] = (int(concurrency), int(queue or 0))
+    return limits
+
+def default_budgets() -> Dict[str, Tuple[int, int]]:
+    """
+    (concurrency, queue) of the read and write budgets, sized to the connection pools:
+    replicas serve reads from pools of their own, without them a quarter of the
+    primary's connections is kept for writes.
+    """
+    capacity = settings.db_option("db_pool_size") + settings.db_option("db_max_overflow")
+    replicas = len(settings.replica_urls())
+    if replicas:
+        read, write = capacity * replicas, capacity
+    else:
+        write = max(1, capacity // 4)
+        read = max(1, capacity - write)
+    read = settings.admission_read_concurrency or read
+    write = settings.admission_write_concurrency or write
+    return {
+        "read": (read, settings.admission_read_queue if settings.admission_read_queue is not None else read * 4),
+        "write": (write, settings.admission_write_queue if settings.admission_write_queue is not None else write * 4)
+    }
+
+class AdmissionControl:
+    """Named budgets, plus budgets of their own for routes listed in ADMISSION_ROUTE_LIMITS"""
+
+    def __init__(self, enabled: bool, timeout: float, budgets: Dict[str, Tuple[int, int]], route_limits: Dict[str, Tuple[int, int]]):
+        self.enabled = enabled
+        self.budgets = {name: Budget(name, c, q, timeout) for name, (c, q) in budgets.items()}
+        self.routes = {name: Budget(name, c, q, timeout) for name, (c, q) in route_limits.items()}
+
+    def budget_for(self, request: Request, default: str) -> Budget:
+        route = request.scope.get("route")
+        override = self.routes.get(getattr(route, "name", None)) if self.routes else None
+        return override or self.budgets[default]
+
+    def dependency(self, default: str):
+        """
+        Route dependency holding a slot of `default` (or the route's own budget) while the
+        endpoint runs, and while the body is sent when it returns an AdmittedStreamingResponse
+        """
+        async def admit(request: Request):
+            if not self.enabled:
+                yield
+                return
+            budget = self.budget_for(request, default)
+            await budget.acquire()
+            slot = request.state.admission_slot = Slot(budget)
+            try:
+                yield
+            except BaseException:
+                slot.release()
+                raise
+            if not slot.handed_off:
+                slot.release()
+        return admit
+
+
+admission = AdmissionControl(
+    enabled=settings.admission_enabled,
+    timeout=settings.admission_queue_timeout,
+    budgets=default_budgets(),
+    route_limits=_parse_route_limits(settings.admission_route_limits)
+)
+
+admit_read = admission.dependency("read")
+admit_write = admission.dependency("write")
@@ -0,0 +1,53 @@
+"""
+The few statements that differ between PostgreSQL and SQLite. Everything else is
+plain SQLAlchemy and runs on both. PostgreSQL-only features have a portable
+fallback or are skipped on SQLite:
+- COPY bulk loads and delta syncs
+- pg_trgm search
+- LISTEN/NOTIFY
+- advisory locks
+"""
+from typing import Sequence
+
+from sqlalchemy import String, any_, bindparam, func, literal_column
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+
+def dialect_name(db) -> str:
+    """Dialect of an AsyncSession, AsyncConnection or AsyncEngine"""
+    dialect = getattr(db, "dialect", None)
+    return (dialect or db.bind.dialect).name
+
+def is_postgres(db) -> bool:
+    return dialect_name(db) == "postgresql"
+
+def is_memory_url(url: str) -> bool:
+    """sqlite:// and sqlite:///:memory: databases live inside one connection"""
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+def insert(db, table):
+    """INSERT with on_conflict_do_update/on_conflict_do_nothing, both dialects take the same arguments"""
+    return pg_insert(table) if is_postgres(db) else sqlite_insert(table)
+
+def inserted_flag(db, model):
+    """
+    RETURNING column telling an upsert's inserted rows from its updated ones. On
+    PostgreSQL xmax is 0 only for tuples created by the statement; elsewhere updated_at,
+    which inserts leave empty and every ON CONFLICT DO UPDATE sets.
+    """
+    if is_postgres(db):
+        return literal_column("xmax = 0").label("inserted")
+    # Not `updated_at IS NULL`: SQLite 3.40 evaluates that to 0 in the RETURNING of an
+    # upsert into a table with NOT NULL columns, typeof() reads the actual value
+    return (func.typeof(model.updated_at) == "null").label("inserted")
+
+def in_values(db, column, values: Sequence[str], name: str):
+    """
+    column IN values. On PostgreSQL as `= ANY(:array)`, a single bind parameter keeps
+    the statement text, and asyncpg's prepared statement, the same for any list size.
+    """
+    if is_postgres(db):
+        return column == any_(bindparam(name, list(values), type_=ARRAY(String)))
+    return column.in_(list(values))
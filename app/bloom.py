@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .models import SwiftCode
+from .cache import _table_fingerprint
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+VALIDATED_CODES = registry.counter(
+    "swift_validate_codes_total",
+    "Codes checked by :validate, by how they were answered "
+    "(invalid_format, country_mismatch, bloom_negative, lookup_hit, lookup_miss)",
+    ("outcome",)
+)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings. `in` never answers False for an added key;
+    it answers True for a key that was never added with about `error_rate` probability.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from the two halves of one 128-bit digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class ActiveCodeFilter:
+    """
+    Bloom filter of all active SWIFT codes, a negative answer means the code is
+    certainly unknown or inactive and needs no database round trip.
+
+    Loaded on first use and, like the snapshot, re-checked against the table
+    fingerprint every `ttl` seconds. Codes written through this process are added
+    right away; deletions are not removed (Bloom filters can't), they only turn into
+    false positives that the database check answers. Codes created by other
+    processes can be missed for at most `ttl` seconds.
+    """
+
+    def __init__(self, enabled: bool = True, ttl: float = 30, error_rate: float = 0.01):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.error_rate = error_rate
+        self._filter: Optional[BloomFilter] = None
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self._filter is not None and time.monotonic() - self._checked_at < self.ttl
+
+    async def bloom(self, db: AsyncSession) -> BloomFilter:
+        if self._is_fresh():
+            return self._filter
+
+        async with self._lock:
+            if self._is_fresh():
+                return self._filter
+
+            fingerprint = await _table_fingerprint(db)
+            if self._filter is None or fingerprint != self._fingerprint:
+                result = await db.execute(select(SwiftCode.swift_code).where(SwiftCode.is_active == True))
+                codes = result.scalars().all()
+                # Headroom for codes added before the next rebuild
+                bloom = BloomFilter(int(len(codes) * 1.25) + 1000, self.error_rate)
+                for code in codes:
+                    bloom.add(code)
+                self._filter, self._fingerprint = bloom, fingerprint
+                logger.info(f"Built Bloom filter over {len(codes)} active codes ({bloom.size // 8} bytes)")
+            self._checked_at = time.monotonic()
+            return self._filter
+
+    def add(self, codes: Iterable[str]):
+        if self._filter is not None:
+            for code in codes:
+                self._filter.add(code)
+
+    def invalidate(self):
+        self._filter = None
+        self._checked_at = 0.0
+
+
+active_code_filter = ActiveCodeFilter(
+    enabled=settings.swift_bloom_enabled,
+    ttl=settings.swift_bloom_ttl,
+    error_rate=settings.swift_bloom_error_rate
+)
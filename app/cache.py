@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .models import SwiftCode, CountryVersion
+from .encoding import encode_basic
+from .search import NgramIndex
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ENABLED = settings.swift_snapshot_enabled
+SNAPSHOT_TTL = settings.swift_snapshot_ttl
+
+
+@dataclass(frozen=True)
+class DirectoryRecord:
+    """Immutable, session-independent copy of an active swift_codes row"""
+    swift_code: str
+    bank_name: str
+    address: str
+    country_iso2: str
+    country_name: str
+    is_headquarter: bool
+    town_name: Optional[str] = None
+
+    @classmethod
+    def from_model(cls, row: SwiftCode) -> "DirectoryRecord":
+        return cls(
+            swift_code=row.swift_code,
+            bank_name=row.bank_name,
+            address=row.address,
+            country_iso2=row.country_iso2,
+            country_name=row.country_name,
+            is_headquarter=row.is_headquarter,
+            town_name=row.town_name
+        )
+
+    @cached_property
+    def fragment(self) -> bytes:
+        # Encoded once per record, a changed row replaces the record and with it the fragment
+        return encode_basic(self)
+
+
+class DirectorySnapshot:
+    """
+    Active SWIFT codes indexed by code, by country and by 8-character bank prefix.
+    Lists inside the indexes are kept sorted by swift_code, same as the DB queries.
+    """
+
+    def __init__(self, records: List[DirectoryRecord], fingerprint: Tuple, country_versions: Dict = None):
+        self.fingerprint = fingerprint
+        self.country_versions: Dict[str, Tuple] = dict(country_versions or {})
+        self.by_code: Dict[str, DirectoryRecord] = {}
+        self.by_country: Dict[str, List[str]] = {}
+        self.branches_by_bank: Dict[str, List[str]] = {}
+        self._search_index: Optional[NgramIndex] = None
+        for record in sorted(records, key=lambda r: r.swift_code):
+            self._index(record)
+
+    def _index(self, record: DirectoryRecord):
+        self.by_code[record.swift_code] = record
+        insort(self.by_country.setdefault(record.country_iso2, []), record.swift_code)
+        if not record.is_headquarter:
+            insort(self.branches_by_bank.setdefault(record.swift_code[:8], []), record.swift_code)
+        if self._search_index is not None:
+            self._search_index.add(record)
+
+    def _unindex(self, record: DirectoryRecord):
+        del self.by_code[record.swift_code]
+        _remove_sorted(self.by_country, record.country_iso2, record.swift_code)
+        if not record.is_headquarter:
+            _remove_sorted(self.branches_by_bank, record.swift_code[:8], record.swift_code)
+        if self._search_index is not None:
+            self._search_index.discard(record)
+
+    def get(self, swift_code: str) -> Optional[DirectoryRecord]:
+        return self.by_code.get(swift_code)
+
+    def branches_of(self, headquarter: DirectoryRecord) -> List[DirectoryRecord]:
+        codes = self.branches_by_bank.get(headquarter.swift_code[:8], [])
+        return [self.by_code[c] for c in codes if c != headquarter.swift_code]
+
+    def country(self, country_iso2: str) -> List[DirectoryRecord]:
+        return [self.by_code[c] for c in self.by_country.get(country_iso2, [])]
+
+    def search_index(self) -> NgramIndex:
+        # Built on first search, then kept up to date by upsert/remove
+        if self._search_index is None:
+            self._search_index = NgramIndex(self.by_code.values())
+        return self._search_index
+
+    def upsert(self, record: DirectoryRecord):
+        existing = self.by_code.get(record.swift_code)
+        if existing is not None:
+            self._unindex(existing)
+        self._index(record)
+
+    def remove(self, swift_code: str):
+        existing = self.by_code.get(swift_code)
+        if existing is not None:
+            self._unindex(existing)
+
+
+def _remove_sorted(index: Dict[str, List[str]], key: str, code: str):
+    codes = index.get(key)
+    if not codes:
+        return
+    pos = bisect_left(codes, code)
+    if pos < len(codes) and codes[pos] == code:
+        del codes[pos]
+    if not codes:
+        del index[key]
+
+
+async def _table_fingerprint(db: AsyncSession) -> Tuple:
+    # Every write path touches one of these: inserts bump the count and created_at,
+    # soft deletes and updates bump updated_at through the model's onupdate.
+    # Country versions are bumped in the same transactions, so they move together.
+    result = await db.execute(
+        select(
+            func.count(SwiftCode.id),
+            func.max(SwiftCode.created_at),
+            func.max(SwiftCode.updated_at)
+        )
+    )
+    return tuple(result.one())
+
+
+class SwiftCodeCache:
+    """
+    Read-through snapshot of the active directory.
+
+    The snapshot is loaded on first use. After `ttl` seconds the next reader runs a
+    cheap fingerprint query and only reloads the table when the fingerprint moved,
+    so writes made by other processes become visible within one TTL. Writes made
+    through this process are applied to the snapshot immediately.
+    """
+
+    def __init__(self, enabled: bool = SNAPSHOT_ENABLED, ttl: float = SNAPSHOT_TTL):
+        self.enabled = enabled
+        self.ttl = ttl
+        self._snapshot: Optional[DirectorySnapshot] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self._snapshot is not None and time.monotonic() - self._checked_at < self.ttl
+
+    async def snapshot(self, db: AsyncSession) -> DirectorySnapshot:
+        if self._is_fresh():
+            return self._snapshot
+
+        async with self._lock:
+            if self._is_fresh():
+                return self._snapshot
+
+            fingerprint = await _table_fingerprint(db)
+            if self._snapshot is None or self._snapshot.fingerprint != fingerprint:
+                result = await db.execute(select(SwiftCode).where(SwiftCode.is_active == True))
+                records = [DirectoryRecord.from_model(row) for row in result.scalars()]
+                versions = await db.execute(select(CountryVersion))
+                self._snapshot = DirectorySnapshot(
+                    records,
+                    fingerprint,
+                    {v.country_iso2: (v.version, v.updated_at) for v in versions.scalars()}
+                )
+                logger.info(f"Loaded SWIFT code snapshot with {len(records)} active codes")
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def upsert(self, record: DirectoryRecord):
+        if self._snapshot is not None:
+            self._snapshot.upsert(record)
+
+    def remove(self, swift_code: str):
+        if self._snapshot is not None:
+            self._snapshot.remove(swift_code)
+
+    def set_country_versions(self, versions: Dict[str, Tuple]):
+        if self._snapshot is not None:
+            self._snapshot.country_versions.update(versions)
+
+    def invalidate(self):
+        self._snapshot = None
+        self._checked_at = 0.0
+
+
+swift_code_cache = SwiftCodeCache()
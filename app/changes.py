@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from .backend import is_postgres
+from .config import settings
+from .metrics import registry
+from .models import SwiftCodeChange
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary constant, serializes writers between taking a seq and committing
+CHANGE_LOG_LOCK_KEY = 0x5317C4A6
+NOTIFY_CHANNEL = "swift_code_changes"
+
+CHANGES_RECORDED = registry.counter(
+    "swift_changes_recorded_total", "Rows appended to the swift_code_changes log, by operation", ("operation",)
+)
+
+async def lock_change_log(db: AsyncSession):
+    """
+    Takes the change log lock until the caller's transaction ends. BIGSERIAL values are
+    handed out in call order but become visible in commit order; holding the lock from
+    the first appended seq to commit keeps both the same, so a reader never sees seq N+1
+    while N is still to come and a cursor never skips a change. SQLite has a single
+    writer at a time anyway.
+    """
+    if is_postgres(db):
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHANGE_LOG_LOCK_KEY})
+
+async def notify_changes(db: AsyncSession):
+    """Queues a NOTIFY with the latest seq, delivered to listeners when the transaction commits"""
+    if settings.swift_change_notify and is_postgres(db):
+        await db.execute(
+            text("SELECT pg_notify(:channel, (SELECT max(seq) FROM swift_code_changes)::text)"),
+            {"channel": NOTIFY_CHANNEL}
+        )
+
+async def record_changes(db: AsyncSession, changes: Iterable[Tuple[str, str, str]]) -> int:
+    """
+    Appends (swift_code, country_iso2, operation) rows to the change log inside the
+    caller's transaction, operation is insert, update or delete. Returns the row count.
+    """
+    rows = [
+        {"swift_code": code, "country_iso2": country, "operation": operation}
+        for code, country, operation in changes
+    ]
+    if not rows:
+        return 0
+
+    await lock_change_log(db)
+    await db.execute(insert(SwiftCodeChange), rows)
+    await notify_changes(db)
+    for row in rows:
+        CHANGES_RECORDED.inc(operation=row["operation"])
+    return len(rows)
+
+
+class ChangeNotifier:
+    """
+    Wakes change feed polls waiting for new changes. Listens on NOTIFY_CHANNEL over one
+    dedicated connection, so writes made by any worker reach every worker; notify() also
+    wakes this worker directly after its own commits.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._changed: Optional[asyncio.Event] = None
+        self._connection: Optional[AsyncConnection] = None
+
+    def subscribe(self) -> asyncio.Event:
+        """Event set by the next change, take it before reading so nothing slips in between"""
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        return self._changed
+
+    def notify(self, *_):
+        # Also the asyncpg listener callback: (connection, pid, channel, payload)
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    async def start(self, engine: AsyncEngine):
+        if not self.enabled or self._connection is not None or not is_postgres(engine):
+            return
+        try:
+            self._connection = await engine.connect()
+            raw_connection = await self._connection.get_raw_connection()
+            await raw_connection.driver_connection.add_listener(NOTIFY_CHANNEL, self.notify)
+            logger.info(f"Listening for change notifications on {NOTIFY_CHANNEL}")
+        except Exception as e:
+            # Long polls still end at their timeout, they only lose the early wake-up
+            logger.warning(f"Change notifications unavailable: {e!r}")
+            await self.stop()
+
+    async def stop(self):
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            try:
+                await connection.close()
+            except Exception as e:
+                logger.debug(f"Closing the change listener failed: {e!r}")
+
+
+change_notifier = ChangeNotifier(enabled=settings.swift_change_notify)
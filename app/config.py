@@ -0,0 +1,150 @@
+import os
+import tempfile
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import AliasChoices, Field, field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+# Engine presets selected with DB_PROFILE. Any DB_* variable set explicitly wins over the preset.
+#
+# high-concurrency: many uvicorn workers against one Postgres. Keep
+#   workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) below the server's max_connections,
+#   fail fast on an exhausted pool instead of queueing for 30 s, and skip the
+#   pre-ping round trip on every checkout (stale connections are recycled instead).
+# pgbouncer: PgBouncer in transaction pooling mode. Server-side prepared statements
+#   don't survive across transactions there, so both statement caches are disabled
+#   and statement names are made unique.
+DB_PRESETS: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    "high-concurrency": {
+        "db_pool_size": 20,
+        "db_max_overflow": 10,
+        "db_pool_timeout": 5,
+        "db_pool_recycle": 1800,
+        "db_pool_pre_ping": False,
+        "db_statement_cache_size": 1000,
+        "db_prepared_statement_cache_size": 500,
+    },
+    "pgbouncer": {
+        "db_pool_size": 10,
+        "db_max_overflow": 0,
+        "db_pool_pre_ping": False,
+        "db_statement_cache_size": 0,
+        "db_prepared_statement_cache_size": 0,
+        "db_unique_statement_names": True,
+    },
+}
+
+def _with_async_driver(url: str) -> str:
+    # Plain postgres URLs (as used by CI) are served through asyncpg, plain sqlite ones through aiosqlite
+    for prefix, driver in (("postgresql://", "postgresql+asyncpg://"), ("postgres://", "postgresql+asyncpg://"), ("sqlite://", "sqlite+aiosqlite://")):
+        if url.startswith(prefix):
+            return driver + url[len(prefix):]
+    return url
+
+class Settings(BaseSettings):
+    """Application settings, read from the environment and an optional .env file"""
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    app_env: str = "development"
+
+    # Database
+    database_url: str = "postgresql+asyncpg://user:password@db/swiftcodes"
+    db_profile: Literal["default", "high-concurrency", "pgbouncer"] = "default"
+    db_pool_size: int = Field(10, ge=1, validation_alias=AliasChoices("DB_POOL_SIZE", "DB_MAX_CONNECTIONS"))
+    db_max_overflow: int = Field(10, ge=0)
+    db_pool_timeout: float = Field(30, gt=0)
+    db_pool_recycle: int = 3600
+    db_pool_pre_ping: bool = True
+    db_echo: bool = False
+    # asyncpg's own statement cache and SQLAlchemy's prepared statement cache, per connection
+    db_statement_cache_size: int = Field(100, ge=0)
+    db_prepared_statement_cache_size: int = Field(100, ge=0)
+    db_unique_statement_names: bool = False
+
+    # Read replicas: DATABASE_READ_URL and/or a comma separated DATABASE_REPLICA_URLS.
+    # Lookups are spread round-robin over them, writes always go to DATABASE_URL.
+    database_read_url: Optional[str] = None
+    database_replica_urls: str = ""
+    # Seconds a replica is skipped after a connection error
+    replica_retry_after: float = Field(30, ge=0)
+    # Seconds after a write during which the same client reads from the primary
+    read_your_writes_window: float = Field(5, ge=0)
+
+    # Prometheus metrics on /metrics
+    metrics_enabled: bool = True
+
+    # Startup: open the pool and preload caches before reporting ready
+    startup_warmup: bool = True
+
+    # Read path
+    swift_snapshot_enabled: bool = False
+    swift_snapshot_ttl: float = 30
+    swift_fast_json: bool = True
+    # Shared memory-mapped directory file, for many workers instead of per-process snapshots
+    swift_mmap_path: Optional[str] = None
+    swift_mmap_check_interval: float = Field(1.0, ge=0)
+    # Bloom filter answering "unknown code" for :validate without a database round trip
+    swift_bloom_enabled: bool = True
+    swift_bloom_ttl: float = 30
+    swift_bloom_error_rate: float = Field(0.01, gt=0, lt=1)
+    # Coalesce concurrent identical lookups into one query
+    swift_singleflight_enabled: bool = True
+    # Postgres LISTEN/NOTIFY wake-ups for long-polling the change feed
+    swift_change_notify: bool = True
+
+    # Archive codes soft-deleted more than N days ago, every interval seconds (unset: never)
+    swift_purge_after_days: Optional[int] = Field(None, ge=0)
+    swift_purge_interval: float = Field(3600, gt=0)
+    swift_purge_batch_size: int = Field(1000, ge=1)
+
+    # Admission control: concurrency budgets for read and write endpoints, sized to the
+    # connection pools unless set. Requests over budget wait in a bounded queue for at most
+    # ADMISSION_QUEUE_TIMEOUT seconds and are otherwise rejected with 503 and Retry-After.
+    admission_enabled: bool = True
+    admission_queue_timeout: float = Field(1.0, gt=0)
+    admission_read_concurrency: Optional[int] = Field(None, ge=1)
+    admission_read_queue: Optional[int] = Field(None, ge=0)
+    admission_write_concurrency: Optional[int] = Field(None, ge=1)
+    admission_write_queue: Optional[int] = Field(None, ge=0)
+    # Budgets of their own for single routes, by endpoint name: "search_swift_codes=4:16,create_code=2:0"
+    admission_route_limits: str = ""
+
+    # Uploaded CSV files wait here until their import job has run
+    import_dir: str = os.path.join(tempfile.gettempdir(), "swift-imports")
+    # Rows per committed batch, asyncpg allows at most 32767 bind parameters per statement
+    import_batch_size: int = Field(2000, ge=1, le=2500)
+    # Workers mark their queued and running jobs alive every IMPORT_HEARTBEAT_INTERVAL
+    # seconds; jobs without a heartbeat for IMPORT_STALE_AFTER seconds belonged to a
+    # worker that died and are marked failed, at startup and then on every heartbeat
+    import_heartbeat_interval: float = Field(30.0, gt=0)
+    import_stale_after: float = Field(300.0, gt=0)
+
+    # Slow query log on GET /api/v1/admin/slow-queries: the SLOW_QUERY_LOG_SIZE slowest
+    # statements over SLOW_QUERY_THRESHOLD seconds, with the plan of a sampled share of them
+    slow_query_log_enabled: bool = False
+    slow_query_threshold: float = Field(0.1, ge=0)
+    slow_query_log_size: int = Field(50, ge=1)
+    slow_query_explain_sample_rate: float = Field(0.1, ge=0, le=1)
+
+    # Shared secret for /api/v1/admin endpoints (X-Admin-Token header), unset disables them
+    admin_token: Optional[str] = None
+
+    @field_validator("database_url", "database_read_url")
+    @classmethod
+    def _async_driver(cls, url: Optional[str]) -> Optional[str]:
+        return _with_async_driver(url) if url else url
+
+    def replica_urls(self) -> List[str]:
+        urls = [self.database_read_url] if self.database_read_url else []
+        urls += [_with_async_driver(u.strip()) for u in self.database_replica_urls.split(",") if u.strip()]
+        return list(dict.fromkeys(urls))
+
+    def db_option(self, name: str) -> Any:
+        """Value of a db_* setting with the DB_PROFILE preset applied"""
+        if name in self.model_fields_set:
+            return getattr(self, name)
+        return DB_PRESETS[self.db_profile].get(name, getattr(self, name))
+
+settings = Settings()
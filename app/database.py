@@ -1,7 +1,18 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from fastapi import Request, Response
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import StaticPool
+import asyncio
 import logging
-from typing import AsyncGenerator
+import time
+import uuid
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from .backend import is_memory_url
+from .config import settings
+from .metrics import METRICS_ENABLED, TimedQueuePool, instrument_engine
+from .profiling import slow_query_log
 
 logger = logging.getLogger(__name__)
 
@@ -9,16 +20,39 @@ logger = logging.getLogger(__name__)
 class Base(DeclarativeBase):
     pass
 
-# Database configuration - now using asyncpg for PostgreSQL (recommended for production)
-DATABASE_URL = "postgresql+asyncpg://user:password@db/swiftcodes"
+# Database configuration - asyncpg for PostgreSQL (recommended for production), aiosqlite for SQLite files and :memory:
+DATABASE_URL = settings.database_url
+
+def engine_options(url: str = DATABASE_URL) -> Dict[str, Any]:
+    """create_async_engine keyword arguments for `url` from the DB_* settings and DB_PROFILE preset"""
+    options = {"echo": settings.db_option("db_echo")}
+    if is_memory_url(url):
+        # Every connection to :memory: opens a database of its own, all sessions share one
+        options["poolclass"] = StaticPool
+        return options
+    options.update({
+        "pool_size": settings.db_option("db_pool_size"),
+        "max_overflow": settings.db_option("db_max_overflow"),
+        "pool_timeout": settings.db_option("db_pool_timeout"),
+        "pool_pre_ping": settings.db_option("db_pool_pre_ping"),
+        "pool_recycle": settings.db_option("db_pool_recycle"),
+    })
+    if url.startswith("postgresql+asyncpg"):
+        connect_args = {
+            "statement_cache_size": settings.db_option("db_statement_cache_size"),
+            "prepared_statement_cache_size": settings.db_option("db_prepared_statement_cache_size"),
+        }
+        if settings.db_option("db_unique_statement_names"):
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+        options["connect_args"] = connect_args
+    if METRICS_ENABLED:
+        options["poolclass"] = TimedQueuePool
+    return options
 
 # Engine configuration with new 2.0 parameters
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=True,
-    pool_pre_ping=True,  # N
-    pool_recycle=3600    # Recycle connections after 1 hour
-)
+engine = create_async_engine(DATABASE_URL, **engine_options())
+instrument_engine(engine, "primary")
+slow_query_log.attach(engine, "primary")
 
 
 AsyncSessionLocal = async_sessionmaker(
@@ -29,6 +63,57 @@ AsyncSessionLocal = async_sessionmaker(
     future=True  # 
 )
 
+REPLICA_ERRORS = (OSError, asyncio.TimeoutError)
+
+class ReplicaRouter:
+    """
+    Round-robin over read replicas. A replica that fails to connect or drops its
+    connection is skipped for `retry_after` seconds, then tried again. With no
+    replica configured or all of them down, reads go to the primary.
+    """
+
+    def __init__(self, engines: List[AsyncEngine], retry_after: float):
+        self.retry_after = retry_after
+        self._next = 0
+        self._down_until: Dict[int, float] = {}
+        for index, replica in enumerate(engines):
+            event.listen(replica.sync_engine, "handle_error", self._error_listener(index))
+        # Reads run in read-only transactions, the derived engines share pool and listeners
+        self.engines = [replica.execution_options(postgresql_readonly=True) for replica in engines]
+
+    def _error_listener(self, index: int):
+        def on_error(context):
+            if context.is_disconnect or isinstance(context.original_exception, REPLICA_ERRORS):
+                self._mark_down(index, context.original_exception)
+        return on_error
+
+    def _mark_down(self, index: int, error: BaseException):
+        self._down_until[index] = time.monotonic() + self.retry_after
+        logger.warning(f"Read replica {index} marked down for {self.retry_after}s: {error}")
+
+    def report_failure(self, replica: AsyncEngine, error: BaseException):
+        # Refused or timed out connects surface as plain OSError, before SQLAlchemy's error hooks
+        for index, candidate in enumerate(self.engines):
+            if candidate is replica:
+                self._mark_down(index, error)
+
+    def pick(self) -> Optional[AsyncEngine]:
+        now = time.monotonic()
+        for offset in range(len(self.engines)):
+            index = (self._next + offset) % len(self.engines)
+            if self._down_until.get(index, 0) <= now:
+                self._next = index + 1
+                return self.engines[index]
+        return None
+
+read_engines = [create_async_engine(url, **engine_options(url)) for url in settings.replica_urls()]
+for index, replica in enumerate(read_engines):
+    instrument_engine(replica, f"replica-{index}")
+    slow_query_log.attach(replica, f"replica-{index}")
+replica_router = ReplicaRouter(read_engines, settings.replica_retry_after)
+
+READ_YOUR_WRITES_COOKIE = "swift_rw_until"
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
     Dependency injection for database sessions
@@ -43,10 +128,64 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         finally:
             await session.close()
 
-async def init_db():
-    """Initialize database with new 2.0 metadata API"""
-    async with engine.begin() as conn:
-        # New metadata API in 2.0
-        await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
-        logger.info("Database tables created using SQLAlchemy 2.0")
\ No newline at end of file
+def remember_write(response: Response):
+    """
+    Dependency for write routes: for the next READ_YOUR_WRITES_WINDOW seconds the
+    client's reads are routed to the primary, so it sees its own write despite replica lag
+    """
+    if read_engines and settings.read_your_writes_window:
+        until = time.time() + settings.read_your_writes_window
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE,
+            f"{until:.3f}",
+            max_age=int(settings.read_your_writes_window) + 1,
+            httponly=True
+        )
+
+def _read_engine(request: Request) -> AsyncEngine:
+    try:
+        recent_write = float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > time.time()
+    except ValueError:
+        recent_write = False
+    if recent_write:
+        return engine
+    return replica_router.pick() or engine
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Dependency for read-only routes, session bound to a read replica when one is available"""
+    bind = _read_engine(request)
+    async with AsyncSessionLocal(bind=bind) as session:
+        try:
+            yield session
+        except REPLICA_ERRORS as e:
+            replica_router.report_failure(bind, e)
+            raise
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+async def warm_up_pool(connections: int = None):
+    """Opens `connections` pooled connections up front on the primary and every replica (default: the pool size)"""
+    connections = connections or settings.db_option("db_pool_size")
+
+    async def _ping(target: AsyncEngine):
+        async with target.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(_ping(target) for target in [engine, *read_engines] for _ in range(connections)))
+    logger.info(f"Database pools warmed up with {connections} connections each")
+
+async def dispose_engines():
+    for target in [engine, *read_engines]:
+        await target.dispose()
+
+async def ping_db(timeout: float = 2.0) -> bool:
+    try:
+        async with engine.connect() as conn:
+            await asyncio.wait_for(conn.execute(text("SELECT 1")), timeout)
+        return True
+    except Exception as e:
+        logger.warning(f"Database ping failed: {str(e)}")
+        return False
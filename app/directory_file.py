@@ -0,0 +1,378 @@
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .models import SwiftCode, CountryVersion
+from .encoding import encode_basic
+from .cache import _table_fingerprint
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SWIFTDIR"
+FORMAT_VERSION = 1
+
+# Layout, all integers little-endian:
+#   header
+#   keys            n_records x 11 bytes, codes sorted, BIC8 codes padded with spaces
+#   entries         n_records x ENTRY, same order as keys
+#   country index   n_records x u32, record numbers ordered by (country, code)
+#   countries       n_countries x COUNTRY, sorted by ISO2, slices of the country index
+#   banks           n_banks x BANK, sorted by bank code, slices of keys
+#   heap            UTF-8 strings and pre-encoded JSON fragments, deduplicated
+HEADER = struct.Struct("<8sIIIIQQQQQQ96s")
+KEY_SIZE = 11
+# fragment off/len, bank_name, address, country_name, town_name off/len, is_headquarter, country_iso2
+ENTRY = struct.Struct("<IIIHIHIHIHB2s")
+COUNTRY = struct.Struct("<2sIIIq")
+BANK = struct.Struct("<8sII")
+INDEX = struct.Struct("<I")
+
+def _key(swift_code: str) -> bytes:
+    return swift_code.encode("ascii").ljust(KEY_SIZE, b" ")
+
+def _fingerprint_text(fingerprint: Tuple) -> bytes:
+    return "|".join("" if v is None else str(v) for v in fingerprint).encode("utf-8")
+
+def _epoch_us(value: Optional[datetime]) -> int:
+    if value is None:
+        return -1
+    return int(value.replace(tzinfo=timezone.utc).timestamp() * 1_000_000)
+
+
+def write_directory_file(path: str, records: Iterable, country_versions: Dict[str, Tuple], fingerprint: Tuple) -> int:
+    """
+    Writes the records (anything with the DirectoryRecord attributes) to `path`.
+    The file is written next to the target and renamed over it, readers mapping the
+    old file keep a consistent view. Returns the number of records.
+    """
+    records = sorted(records, key=lambda r: r.swift_code)
+    heap = bytearray()
+    interned: Dict[bytes, int] = {}
+
+    def put(value: Optional[str]) -> Tuple[int, int]:
+        data = (value or "").encode("utf-8")
+        offset = interned.get(data)
+        if offset is None:
+            offset = interned[data] = len(heap)
+            heap.extend(data)
+        return offset, len(data)
+
+    keys = bytearray()
+    entries = bytearray()
+    banks: List[Tuple[str, int, int]] = []
+    for number, record in enumerate(records):
+        keys.extend(_key(record.swift_code))
+        fragment = encode_basic(record)
+        fragment_offset = len(heap)
+        heap.extend(fragment)
+        entries.extend(ENTRY.pack(
+            fragment_offset, len(fragment),
+            *put(record.bank_name), *put(record.address), *put(record.country_name), *put(record.town_name),
+            1 if record.is_headquarter else 0, record.country_iso2.encode("ascii")
+        ))
+        bank_code = record.swift_code[:8]
+        if banks and banks[-1][0] == bank_code:
+            banks[-1] = (bank_code, banks[-1][1], banks[-1][2] + 1)
+        else:
+            banks.append((bank_code, number, 1))
+
+    by_country = sorted(range(len(records)), key=lambda n: (records[n].country_iso2, records[n].swift_code))
+    country_index = b"".join(INDEX.pack(n) for n in by_country)
+    ranges: Dict[str, Tuple[int, int]] = {}
+    for position, number in enumerate(by_country):
+        start, count = ranges.get(records[number].country_iso2, (position, 0))
+        ranges[records[number].country_iso2] = (start, count + 1)
+    countries = b"".join(
+        COUNTRY.pack(
+            iso2.encode("ascii"), *ranges.get(iso2, (0, 0)),
+            country_versions.get(iso2, (0, None))[0], _epoch_us(country_versions.get(iso2, (0, None))[1])
+        )
+        for iso2 in sorted(set(ranges) | set(country_versions))
+    )
+    bank_table = b"".join(BANK.pack(code.encode("ascii"), start, count) for code, start, count in banks)
+
+    keys_offset = HEADER.size
+    entries_offset = keys_offset + len(keys)
+    index_offset = entries_offset + len(entries)
+    countries_offset = index_offset + len(country_index)
+    banks_offset = countries_offset + len(countries)
+    heap_offset = banks_offset + len(bank_table)
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, len(records), len(countries) // COUNTRY.size, len(banks),
+        keys_offset, entries_offset, index_offset, countries_offset, banks_offset, heap_offset,
+        _fingerprint_text(fingerprint)[:96]
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".directory-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as output:
+            for part in (header, keys, entries, country_index, countries, bank_table, heap):
+                output.write(part)
+            output.flush()
+            os.fsync(output.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return len(records)
+
+
+class MappedRecord:
+    """A record inside a DirectoryFile, strings are decoded on access and `fragment` is a zero-copy view"""
+
+    __slots__ = ("_file", "_entry", "swift_code")
+
+    def __init__(self, directory_file: "DirectoryFile", number: int):
+        self._file = directory_file
+        self._entry = ENTRY.unpack_from(directory_file._mm, directory_file._entries_offset + number * ENTRY.size)
+        self.swift_code = directory_file._key(number).rstrip(b" ").decode("ascii")
+
+    def _string(self, field: int) -> Optional[str]:
+        offset, length = self._entry[field], self._entry[field + 1]
+        start = self._file._heap_offset + offset
+        return self._file._mm[start:start + length].decode("utf-8")
+
+    @property
+    def fragment(self) -> memoryview:
+        start = self._file._heap_offset + self._entry[0]
+        return self._file._view[start:start + self._entry[1]]
+
+    @property
+    def bank_name(self) -> str:
+        return self._string(2)
+
+    @property
+    def address(self) -> str:
+        return self._string(4)
+
+    @property
+    def country_name(self) -> str:
+        return self._string(6)
+
+    @property
+    def town_name(self) -> Optional[str]:
+        return self._string(8) or None
+
+    @property
+    def is_headquarter(self) -> bool:
+        return bool(self._entry[10])
+
+    @property
+    def country_iso2(self) -> str:
+        return self._entry[11].decode("ascii")
+
+
+class DirectoryFile:
+    """Read-only memory mapping of a directory file, shared through the page cache by all workers"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as source:
+            stat = os.fstat(source.fileno())
+            self._mm = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self._view = memoryview(self._mm)
+
+        (
+            magic, version, self.size, self._n_countries, self._n_banks,
+            self._keys_offset, self._entries_offset, self._index_offset,
+            self._countries_offset, self._banks_offset, self._heap_offset, fingerprint
+        ) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} directory file")
+        self.fingerprint = fingerprint.rstrip(b"\0")
+
+    def _key(self, number: int) -> bytes:
+        start = self._keys_offset + number * KEY_SIZE
+        return self._mm[start:start + KEY_SIZE]
+
+    def _bisect_keys(self, key: bytes, low: int = 0, high: int = None) -> int:
+        high = self.size if high is None else high
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _find_table(self, offset: int, count: int, row: struct.Struct, width: int, key: bytes) -> Optional[tuple]:
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            start = offset + middle * row.size
+            if self._mm[start:start + width] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < count and self._mm[offset + low * row.size:offset + low * row.size + width] == key:
+            return row.unpack_from(self._mm, offset + low * row.size)
+        return None
+
+    def get(self, swift_code: str) -> Optional[MappedRecord]:
+        key = _key(swift_code)
+        number = self._bisect_keys(key)
+        if number < self.size and self._key(number) == key:
+            return MappedRecord(self, number)
+        return None
+
+    def branches_of(self, headquarter: MappedRecord) -> List[MappedRecord]:
+        bank = self._find_table(self._banks_offset, self._n_banks, BANK, 8, headquarter.swift_code[:8].encode("ascii"))
+        if bank is None:
+            return []
+        _, start, count = bank
+        branches = (MappedRecord(self, n) for n in range(start, start + count))
+        return [b for b in branches if not b.is_headquarter and b.swift_code != headquarter.swift_code]
+
+    def _country_range(self, country_iso2: str) -> Optional[tuple]:
+        return self._find_table(self._countries_offset, self._n_countries, COUNTRY, 2, country_iso2.encode("ascii"))
+
+    def country(self, country_iso2: str, limit: int = None, after: str = None) -> List[MappedRecord]:
+        """Codes of a country in code order, optionally the keyset page after `after`"""
+        entry = self._country_range(country_iso2)
+        if entry is None:
+            return []
+        _, start, count, _, _ = entry
+        low, high = start, start + count
+        if after:
+            key = _key(after)
+            while low < high:
+                middle = (low + high) // 2
+                if self._key(self._country_record(middle)) <= key:
+                    low = middle + 1
+                else:
+                    high = middle
+            high = start + count
+        end = min(high, low + limit) if limit else high
+        return [MappedRecord(self, self._country_record(position)) for position in range(low, end)]
+
+    def _country_record(self, position: int) -> int:
+        return INDEX.unpack_from(self._mm, self._index_offset + position * INDEX.size)[0]
+
+    def country_version(self, country_iso2: str) -> Tuple[int, Optional[datetime]]:
+        entry = self._country_range(country_iso2)
+        if entry is None or not entry[3]:
+            return 0, None
+        updated_at = None
+        if entry[4] >= 0:
+            updated_at = datetime.fromtimestamp(entry[4] / 1_000_000, tz=timezone.utc).replace(tzinfo=None)
+        return entry[3], updated_at
+
+
+class MappedDirectory:
+    """
+    Per-process handle on the shared directory file.
+
+    Every process maps the same file, so the directory lives once in the page cache no
+    matter how many workers run. Writes schedule a rebuild from the database, the new
+    file replaces the old one atomically. Other workers notice the new inode within
+    `check_interval` seconds and remap; requests still holding records of the old
+    mapping keep it alive until they finish.
+    """
+
+    def __init__(self, path: Optional[str] = None, check_interval: float = 1.0):
+        self.path = path
+        self.enabled = bool(path)
+        self.check_interval = check_interval
+        self._file: Optional[DirectoryFile] = None
+        self._checked_at = 0.0
+        self._rebuild_task: Optional[asyncio.Future] = None
+        self._rebuild_pending = False
+
+    def reader(self) -> Optional[DirectoryFile]:
+        """The current mapping, None while no file has been built yet"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._remap()
+        return self._file
+
+    def _remap(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if self._file is not None and self._file.identity == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            return
+        try:
+            self._file = DirectoryFile(self.path)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Could not map directory file {self.path}: {e}")
+
+    async def rebuild(self, db: AsyncSession):
+        """Exports the active directory and swaps it in"""
+        started = time.perf_counter()
+        fingerprint = await _table_fingerprint(db)
+        rows = (await db.execute(
+            select(
+                SwiftCode.swift_code,
+                SwiftCode.bank_name,
+                SwiftCode.address,
+                SwiftCode.country_iso2,
+                SwiftCode.country_name,
+                SwiftCode.town_name,
+                SwiftCode.is_headquarter
+            ).where(SwiftCode.is_active == True)
+        )).all()
+        versions = {
+            v.country_iso2: (v.version, v.updated_at)
+            for v in (await db.execute(select(CountryVersion))).scalars()
+        }
+        count = await asyncio.to_thread(write_directory_file, self.path, rows, versions, fingerprint)
+        self._file = DirectoryFile(self.path)
+        self._checked_at = time.monotonic()
+        logger.info(f"Directory file {self.path} rebuilt with {count} codes in {time.perf_counter() - started:.2f}s")
+
+    async def ensure_current(self, db: AsyncSession):
+        """Startup: maps an up to date file right away, rebuilds a missing or stale one"""
+        self._remap()
+        fingerprint = _fingerprint_text(await _table_fingerprint(db))[:96]
+        if self._file is None or self._file.fingerprint != fingerprint:
+            await self.rebuild(db)
+
+    def schedule_rebuild(self, bind):
+        """
+        Called after committed writes. Rebuilds run in the background, one at a time;
+        writes arriving during a rebuild are folded into a single follow-up rebuild.
+        """
+        if not self.enabled:
+            return
+        self._rebuild_pending = True
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.ensure_future(self._rebuild_while_pending(bind))
+
+    async def _rebuild_while_pending(self, bind):
+        while self._rebuild_pending:
+            self._rebuild_pending = False
+            try:
+                async with AsyncSession(bind=bind) as session:
+                    await self.rebuild(session)
+            except Exception as e:
+                logger.error(f"Directory file rebuild failed: {str(e)}")
+
+    async def wait_idle(self):
+        if self._rebuild_task is not None:
+            await self._rebuild_task
+
+
+mapped_directory = MappedDirectory(settings.swift_mmap_path, settings.swift_mmap_check_interval)
+
+registry.gauge(
+    "directory_file_records", "Codes in the mapped directory file of this process", (),
+    lambda: {(): mapped_directory._file.size} if mapped_directory._file is not None else {}
+)
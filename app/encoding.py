@@ -0,0 +1,39 @@
+from typing import Iterable
+
+import orjson
+
+from .config import settings
+
+# Serve GET responses as pre-encoded bytes instead of building and validating Pydantic models
+FAST_JSON = settings.swift_fast_json
+
+def basic_fragment(record) -> bytes:
+    """JSON of a SwiftCodeBasic, pre-encoded for snapshot records and encoded on the spot otherwise"""
+    fragment = getattr(record, "fragment", None)
+    return fragment if fragment is not None else encode_basic(record)
+
+def encode_basic(record) -> bytes:
+    # Field order as declared on SwiftCodeBasic in app/schemas.py
+    return orjson.dumps({
+        "swiftCode": record.swift_code,
+        "bankName": record.bank_name,
+        "address": record.address,
+        "countryISO2": record.country_iso2,
+        "isHeadquarter": record.is_headquarter
+    })
+
+def encode_with_branches(record, branches: Iterable) -> bytes:
+    """JSON of a SwiftCodeWithBranches, appended to the record's own fragment"""
+    return b"".join((
+        basic_fragment(record)[:-1],
+        b',"countryName":', orjson.dumps(record.country_name),
+        b',"branches":[', b",".join(basic_fragment(b) for b in branches), b"]}"
+    ))
+
+def encode_country(country_iso2: str, country_name: str, records: Iterable) -> bytes:
+    """JSON of a CountrySwiftCodesResponse"""
+    return b"".join((
+        b'{"countryISO2":', orjson.dumps(country_iso2),
+        b',"countryName":', orjson.dumps(country_name),
+        b',"swiftCodes":[', b",".join(basic_fragment(r) for r in records), b"]}"
+    ))
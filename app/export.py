@@ -0,0 +1,94 @@
+import csv
+import io
+import zlib
+from typing import AsyncIterator, Iterable
+
+import orjson
+
+# Header of the directory CSV as read by utils._csv_reader, an export re-imports as is
+CSV_COLUMNS = (
+    'COUNTRY ISO2 CODE',
+    'SWIFT CODE',
+    'CODE TYPE',
+    'NAME',
+    'ADDRESS',
+    'TOWN NAME',
+    'COUNTRY NAME',
+    'TIME ZONE'
+)
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson"
+}
+
+def _csv_address(record) -> str:
+    # The importer stores "ADDRESS, TOWN NAME", give the town back its own column
+    suffix = f", {record.town_name}" if record.town_name else None
+    if suffix and record.address.endswith(suffix):
+        return record.address[:-len(suffix)]
+    return record.address
+
+def csv_row(record) -> tuple:
+    return (
+        record.country_iso2,
+        record.swift_code,
+        'HEADQUARTER' if record.is_headquarter else 'BRANCH',
+        record.bank_name,
+        _csv_address(record),
+        record.town_name or '',
+        record.country_name,
+        record.time_zone or ''
+    )
+
+class CsvEncoder:
+    """Encodes row chunks to CSV bytes, the header goes out with the first chunk"""
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+        self._writer.writerow(CSV_COLUMNS)
+
+    def encode(self, records: Iterable) -> bytes:
+        self._writer.writerows(csv_row(record) for record in records)
+        chunk = self._buffer.getvalue().encode("utf-8")
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return chunk
+
+class NdjsonEncoder:
+    """Encodes row chunks to one JSON object per line, with every column the CSV carries"""
+
+    def encode(self, records: Iterable) -> bytes:
+        return b"".join(
+            orjson.dumps({
+                "swiftCode": record.swift_code,
+                "bankName": record.bank_name,
+                "address": record.address,
+                "townName": record.town_name,
+                "countryISO2": record.country_iso2,
+                "countryName": record.country_name,
+                "timeZone": record.time_zone,
+                "isHeadquarter": record.is_headquarter
+            }, option=orjson.OPT_APPEND_NEWLINE)
+            for record in records
+        )
+
+ENCODERS = {"csv": CsvEncoder, "ndjson": NdjsonEncoder}
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            # Explicitly refused with q=0
+            return params.replace(" ", "").lower() not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """gzip framing (wbits=31) applied chunk by chunk, only the compressor state is held"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,337 @@
+import asyncio
+import csv
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import List, Optional, Set, Tuple
+
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import func, or_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from . import backend
+from .bloom import active_code_filter
+from .cache import DirectoryRecord, swift_code_cache
+from .changes import change_notifier, record_changes
+from .config import settings
+from .database import AsyncSessionLocal
+from .directory_file import mapped_directory
+from .metrics import registry
+from .models import ImportJob, SwiftCode
+from .schemas import ImportJobResponse
+from .utils import _csv_reader, _normalize_row
+from .versions import bump_country_versions, stored_countries
+
+logger = logging.getLogger(__name__)
+
+IMPORT_ROWS = registry.counter(
+    "swift_import_rows_total", "CSV rows handled by import jobs, by outcome", ("outcome",)
+)
+
+# Columns an import rewrites on an existing code, everything the CSV carries
+_IMPORT_COLUMNS = (
+    "bank_code",
+    "country_iso2",
+    "code_type",
+    "bank_name",
+    "address",
+    "town_name",
+    "country_name",
+    "time_zone",
+    "is_headquarter",
+    "content_hash"
+)
+
+def _open_reader(path: str) -> Tuple[object, csv.DictReader]:
+    csvfile = open(path, mode='r', encoding='utf-8-sig')
+    try:
+        return csvfile, _csv_reader(csvfile)
+    except Exception:
+        csvfile.close()
+        raise
+
+def _parse_batch(reader: csv.DictReader, size: int) -> Tuple[int, List[dict]]:
+    """Reads up to `size` rows, returns (rows read, valid records). Runs in a worker thread."""
+    read = 0
+    records = []
+    for row in islice(reader, size):
+        read += 1
+        try:
+            records.append(_normalize_row(row))
+        except Exception as e:
+            logger.error(f"Error in row {reader.line_num}: {str(e)}")
+    return read, records
+
+async def _write_batch(db: AsyncSession, records: List[dict]) -> Tuple[list, List[str]]:
+    """
+    Upserts one batch. Rows whose content hash matches an active code are left alone,
+    within the batch the last occurrence of a code wins. Returns the written rows and
+    the countries the written codes were stored under before.
+    """
+    rows = {record["swift_code"]: record for record in records}
+    previous = await stored_countries(db, list(rows))
+    stmt = backend.insert(db, SwiftCode).values([
+        {**record, "id": uuid.uuid4(), "is_active": True} for record in rows.values()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SwiftCode.swift_code],
+        set_={
+            **{c: stmt.excluded[c] for c in _IMPORT_COLUMNS},
+            "is_active": True,
+            "updated_at": func.now()
+        },
+        where=or_(SwiftCode.content_hash.is_distinct_from(stmt.excluded.content_hash), SwiftCode.is_active == False)
+    )
+    result = await db.execute(stmt.returning(
+        SwiftCode.swift_code,
+        SwiftCode.bank_name,
+        SwiftCode.address,
+        SwiftCode.country_iso2,
+        SwiftCode.country_name,
+        SwiftCode.is_headquarter,
+        SwiftCode.town_name,
+        backend.inserted_flag(db, SwiftCode)
+    ))
+    written = result.all()
+    return written, [previous[row.swift_code] for row in written if row.swift_code in previous]
+
+def job_response(job: ImportJob) -> ImportJobResponse:
+    rate = None
+    if job.started_at is not None:
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+        rate = round(job.rows_processed / elapsed, 1) if elapsed > 0 else None
+    return ImportJobResponse(
+        id=str(job.id),
+        status=job.status,
+        filename=job.filename,
+        rowsProcessed=job.rows_processed,
+        rowsRejected=job.rows_rejected,
+        rowsInserted=job.rows_inserted,
+        rowsUpdated=job.rows_updated,
+        rowsUnchanged=job.rows_processed - job.rows_rejected - job.rows_inserted - job.rows_updated,
+        rowsPerSecond=rate,
+        error=job.error,
+        createdAt=job.created_at,
+        startedAt=job.started_at,
+        finishedAt=job.finished_at
+    )
+
+
+class ImportRunner:
+    """
+    Runs CSV uploads as background jobs of this worker, one at a time, others wait as
+    queued. Parsing runs in a thread and every batch is written and committed together
+    with the job's counters, so the event loop is free between short statements and
+    GET /imports/{id} answers from any worker with exactly what has been committed.
+    A job interrupted by shutdown is marked failed; rows committed so far stay.
+    Jobs of a worker that died without a shutdown stop getting heartbeats and are
+    failed by the next worker to check, their uploads are removed.
+    """
+
+    def __init__(self, directory: str, batch_size: int, heartbeat_interval: float, stale_after: float):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._running: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._jobs: Set[uuid.UUID] = set()
+        self._watchdog: Optional[asyncio.Task] = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Created on first use, inside the running loop
+        if self._running is None:
+            self._running = asyncio.Semaphore(1)
+        return self._running
+
+    async def submit(self, db: AsyncSession, upload: UploadFile) -> ImportJob:
+        job = ImportJob(
+            id=uuid.uuid4(),
+            filename=(upload.filename or "")[:255] or None,
+            status="queued",
+            rows_processed=0,
+            rows_rejected=0,
+            rows_inserted=0,
+            rows_updated=0,
+            created_at=datetime.utcnow(),
+            heartbeat_at=datetime.utcnow()
+        )
+        path = os.path.join(self.directory, f"{job.id}.csv")
+
+        # The multipart parser already spooled the upload to a temporary file, copy it
+        # off the event loop to a path that outlives the request
+        def save():
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "wb") as target:
+                shutil.copyfileobj(upload.file, target, 1024 * 1024)
+        await asyncio.to_thread(save)
+
+        try:
+            db.add(job)
+            await db.commit()
+        except SQLAlchemyError:
+            await db.rollback()
+            os.remove(path)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to create import job"
+            )
+
+        self._jobs.add(job.id)
+        task = asyncio.create_task(self._run(db.bind, job.id, path))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _set(self, bind: AsyncEngine, job_id: uuid.UUID, **values):
+        async with AsyncSessionLocal(bind=bind) as session:
+            await session.execute(
+                update(ImportJob).where(ImportJob.id == job_id).values(heartbeat_at=datetime.utcnow(), **values)
+            )
+            await session.commit()
+
+    async def _run(self, bind: AsyncEngine, job_id: uuid.UUID, path: str):
+        try:
+            async with self._semaphore():
+                await self._set(bind, job_id, status="running", started_at=datetime.utcnow())
+                await self._import(bind, job_id, path)
+            await self._set(bind, job_id, status="succeeded", finished_at=datetime.utcnow())
+            logger.info(f"Import job {job_id} finished")
+        except asyncio.CancelledError:
+            await self._set(bind, job_id, status="failed", error="Interrupted by shutdown", finished_at=datetime.utcnow())
+            raise
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else repr(e)
+            logger.error(f"Import job {job_id} failed: {detail}")
+            await self._set(bind, job_id, status="failed", error=str(detail)[:1024], finished_at=datetime.utcnow())
+        finally:
+            self._jobs.discard(job_id)
+            self._remove_upload(path)
+
+    @staticmethod
+    def _remove_upload(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    async def _import(self, bind: AsyncEngine, job_id: uuid.UUID, path: str):
+        csvfile, reader = await asyncio.to_thread(_open_reader, path)
+        try:
+            async with AsyncSessionLocal(bind=bind) as session:
+                while True:
+                    read, records = await asyncio.to_thread(_parse_batch, reader, self.batch_size)
+                    if not read:
+                        break
+                    await self._commit_batch(session, job_id, read, records)
+        finally:
+            csvfile.close()
+            # Bulk changes go to the other read paths once, not per batch
+            mapped_directory.schedule_rebuild(bind)
+
+    async def _commit_batch(self, db: AsyncSession, job_id: uuid.UUID, read: int, records: List[dict]):
+        written, moved_from = await _write_batch(db, records) if records else ([], [])
+        inserted = sum(1 for row in written if row.inserted)
+        versions = await bump_country_versions(db, [row.country_iso2 for row in written] + moved_from)
+        await record_changes(db, [
+            (row.swift_code, row.country_iso2, "insert" if row.inserted else "update") for row in written
+        ])
+        await db.execute(
+            update(ImportJob).where(ImportJob.id == job_id).values(
+                rows_processed=ImportJob.rows_processed + read,
+                rows_rejected=ImportJob.rows_rejected + (read - len(records)),
+                rows_inserted=ImportJob.rows_inserted + inserted,
+                rows_updated=ImportJob.rows_updated + (len(written) - inserted),
+                heartbeat_at=datetime.utcnow()
+            )
+        )
+        await db.commit()
+
+        for row in written:
+            swift_code_cache.upsert(DirectoryRecord.from_model(row))
+        swift_code_cache.set_country_versions(versions)
+        active_code_filter.add(row.swift_code for row in written)
+        if written:
+            change_notifier.notify()
+        IMPORT_ROWS.inc(read - len(records), outcome="rejected")
+        IMPORT_ROWS.inc(inserted, outcome="inserted")
+        IMPORT_ROWS.inc(len(written) - inserted, outcome="updated")
+        IMPORT_ROWS.inc(len(records) - len(written), outcome="unchanged")
+
+    async def start(self, bind: AsyncEngine):
+        """Fails jobs abandoned by dead workers, then keeps this worker's jobs alive in the background"""
+        await self.recover(bind)
+        self._watchdog = asyncio.create_task(self._watch(bind))
+
+    async def _watch(self, bind: AsyncEngine):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                if self._jobs:
+                    async with AsyncSessionLocal(bind=bind) as session:
+                        await session.execute(
+                            update(ImportJob)
+                            .where(ImportJob.id.in_(list(self._jobs)))
+                            .values(heartbeat_at=datetime.utcnow())
+                        )
+                        await session.commit()
+                await self.recover(bind)
+            except Exception as e:
+                logger.error(f"Import job heartbeat failed: {e!r}")
+
+    async def recover(self, bind: AsyncEngine) -> int:
+        """
+        Marks queued and running jobs failed when their worker has not sent a heartbeat
+        for `stale_after` seconds and removes their uploads. Returns the number of jobs.
+        """
+        now = datetime.utcnow()
+        stmt = (
+            update(ImportJob)
+            .where(ImportJob.status.in_(("queued", "running")))
+            .where(func.coalesce(ImportJob.heartbeat_at, ImportJob.created_at) < now - timedelta(seconds=self.stale_after))
+            .values(status="failed", error="Abandoned, the worker running it stopped", finished_at=now)
+            .returning(ImportJob.id)
+        )
+        if self._jobs:
+            stmt = stmt.where(ImportJob.id.not_in(list(self._jobs)))
+        async with AsyncSessionLocal(bind=bind) as session:
+            abandoned = (await session.execute(stmt)).scalars().all()
+            await session.commit()
+
+        for job_id in abandoned:
+            logger.warning(f"Import job {job_id} was abandoned by its worker, marked failed")
+            self._remove_upload(os.path.join(self.directory, f"{job_id}.csv"))
+        return len(abandoned)
+
+    async def shutdown(self):
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            await asyncio.gather(self._watchdog, return_exceptions=True)
+            self._watchdog = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+async def get_import_job(db: AsyncSession, job_id: uuid.UUID) -> ImportJobResponse:
+    try:
+        job = await db.get(ImportJob, job_id)
+    except SQLAlchemyError:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Database operation failed"
+        )
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Import job {job_id} not found")
+    return job_response(job)
+
+
+import_runner = ImportRunner(
+    settings.import_dir,
+    settings.import_batch_size,
+    settings.import_heartbeat_interval,
+    settings.import_stale_after
+)
@@ -1,18 +1,46 @@
-from fastapi import FastAPI, Depends, HTTPException, status, APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Depends, HTTPException, status, APIRouter, Query, Request, Response, Header, File, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Annotated, Union
+from sqlalchemy.exc import SQLAlchemyError
+from typing import Annotated, Literal, Optional, Union
 from contextlib import asynccontextmanager
+import asyncio
 import logging
-from .database import get_db, init_db
-from . import services
+import secrets
+import uuid
+from .database import get_db, get_read_db, remember_write, engine, AsyncSessionLocal, warm_up_pool, dispose_engines, ping_db
+from .migrations import init_db
+from .config import settings
+from . import services, versions, encoding, metrics, maintenance, export
+from .cache import swift_code_cache
+from .directory_file import mapped_directory
+from .changes import change_notifier
+from .admission import AdmittedStreamingResponse, admit_read, admit_write
+from .profiling import slow_query_log
+from .imports import import_runner, get_import_job, job_response
 from .schemas import (
     SwiftCodeBasic,
     SwiftCodeWithBranches,
     CountrySwiftCodesResponse,
     SwiftCodeCreate,
     SwiftCodeCreateResponse,
-    SwiftCodeDeleteResponse
+    SwiftCodeDeleteResponse,
+    SwiftCodeBatchGetRequest,
+    SwiftCodeBatchGetResponse,
+    SwiftCodeBatchCreateRequest,
+    SwiftCodeBatchCreateResponse,
+    SwiftCodeSearchResponse,
+    SwiftCodeValidateRequest,
+    SwiftCodeValidateResponse,
+    SwiftCodeChangesResponse,
+    PurgeResponse,
+    SlowQuery,
+    SlowQueriesResponse,
+    ImportJobResponse,
+    MAX_PAGE_SIZE,
+    MAX_SEARCH_RESULTS,
+    MAX_CHANGES_PAGE,
+    MAX_CHANGES_WAIT
 )
 
 # Konfiguracja logowania
@@ -21,9 +49,37 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Liveness is reported right away, readiness only once the pool and caches are warm
+    app.state.ready = False
     await init_db()
+    if mapped_directory.enabled:
+        # Maps the shared file as is when it matches the table, rebuilds it otherwise
+        async with AsyncSessionLocal() as session:
+            await mapped_directory.ensure_current(session)
+    if settings.startup_warmup:
+        await warm_up_pool()
+        if swift_code_cache.enabled:
+            async with AsyncSessionLocal() as session:
+                snapshot = await swift_code_cache.snapshot(session)
+            snapshot.search_index()
+    await change_notifier.start(engine)
+    await import_runner.start(engine)
+    purge_job = None
+    if settings.swift_purge_after_days is not None:
+        purge_job = asyncio.create_task(maintenance.run_purge_job(
+            settings.swift_purge_after_days, settings.swift_purge_interval, settings.swift_purge_batch_size
+        ))
+    app.state.ready = True
     logger.info("Application startup complete")
     yield
+    app.state.ready = False
+    if purge_job is not None:
+        purge_job.cancel()
+        await asyncio.gather(purge_job, return_exceptions=True)
+    await import_runner.shutdown()
+    await change_notifier.stop()
+    await mapped_directory.wait_idle()
+    await dispose_engines()
     logger.info("Application shutdown")
 
 # Inicjalizacja aplikacji
@@ -33,46 +89,259 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Router dla endpointów API
 api_router = APIRouter(prefix="/api")
 
+# Registered before /v1/swift-codes/{swift_code}, which would otherwise match "search", "changes" and "export"
+@api_router.get(
+    "/v1/swift-codes/search",
+    dependencies=[Depends(admit_read)],
+    response_model=SwiftCodeSearchResponse,
+    responses={
+        400: {"description": "Query has no searchable words"},
+        500: {"description": "Internal server error"},
+        503: {"description": "Over capacity, retry after Retry-After seconds"}
+    }
+)
+async def search_swift_codes(
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    q: Annotated[str, Query(min_length=1, max_length=100)],
+    country: Annotated[Optional[str], Query(min_length=2, max_length=2)] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_SEARCH_RESULTS)] = 20
+):
+    """
+    Search active SWIFT codes, e.g. `q=sofia unicredit`
+    - Every word has to match: a prefix of the SWIFT code, or a word of the bank or town name (typo tolerant)
+    - Results are ranked by score, code prefix matches first
+    """
+    return await services.search_swift_codes(db, q, country, limit)
+
+# No admission budget: a long poll would hold its slot while it waits, it frees its connection instead
+@api_router.get(
+    "/v1/swift-codes/changes",
+    response_model=SwiftCodeChangesResponse,
+    responses={500: {"description": "Internal server error"}}
+)
+async def get_swift_code_changes(
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    since: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=MAX_CHANGES_PAGE)] = 100,
+    wait: Annotated[float, Query(ge=0, le=MAX_CHANGES_WAIT)] = 0
+):
+    """
+    Inserts, updates and soft-deletes after the `since` cursor, oldest first
+    - Start with `since=0`, then poll with the returned `nextSince` until `hasMore` is false
+    - `record` is the code's current state, null once it was deleted
+    - `wait=N` holds an empty poll open up to N seconds and answers as soon as something changes
+    """
+    return await services.get_swift_code_changes(db, since, limit, wait)
+
+@api_router.get(
+    "/v1/swift-codes/export",
+    dependencies=[Depends(admit_read)],
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/csv": {}, "application/x-ndjson": {}}},
+        500: {"description": "Internal server error"},
+        503: {"description": "Over capacity, retry after Retry-After seconds"}
+    }
+)
+async def export_swift_codes(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    format: Literal["ndjson", "csv"] = "ndjson"
+):
+    """
+    Stream every active SWIFT code, ordered by country and code
+    - `format=csv` uses the import file's columns, so an export can be loaded elsewhere as is
+    - Compressed on the fly with `Accept-Encoding: gzip`
+    - `X-Changes-Since` is the change feed cursor to continue from after loading the export
+    """
+    headers = {
+        "Content-Disposition": f'attachment; filename="swift-codes.{format}"',
+        "X-Changes-Since": str(await services.get_latest_change_seq(db)),
+        "Vary": "Accept-Encoding"
+    }
+    body = services.stream_directory_export(db, format)
+    if export.accepts_gzip(request.headers.get("accept-encoding", "")):
+        body = export.gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return AdmittedStreamingResponse(request, body, media_type=export.MEDIA_TYPES[format], headers=headers)
+
 @api_router.get(
     "/v1/swift-codes/{swift_code}",
+    dependencies=[Depends(admit_read)],
     response_model=Union[SwiftCodeWithBranches, SwiftCodeBasic],
     responses={
+        304: {"description": "Not modified since the ETag in If-None-Match"},
         404: {"description": "SWIFT code not found"},
-        500: {"description": "Internal server error"}
+        500: {"description": "Internal server error"},
+        503: {"description": "Over capacity, retry after Retry-After seconds"}
     }
 )
 async def get_swift_code(
     swift_code: str,
-    db: Annotated[AsyncSession, Depends(get_db)]
+    request: Request,
+    response: Response,
+    db: Annotated[AsyncSession, Depends(get_read_db)]
 ):
-    
-    return await services.get_swift_code(db, swift_code)
+    # The version of the code's country covers the code and its branches. It is read
+    # before the body, so a concurrent write can leave the ETag older than the body but
+    # never newer. Positions 5-6 of a BIC are its country unless the stored row says
+    # otherwise, then the version is read again for the stored country.
+    swift_code = swift_code.upper()
+    country = swift_code[4:6]
+    for _ in range(2):
+        version, updated_at = await versions.get_country_version(db, country)
+        document, stored_country = await services.get_swift_code_document(db, swift_code, as_json=encoding.FAST_JSON)
+        if stored_country == country:
+            break
+        country = stored_country
+
+    etag = versions.make_etag(swift_code, version)
+    headers = versions.validator_headers(etag, updated_at)
+    if versions.is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if encoding.FAST_JSON:
+        return Response(content=document, media_type="application/json", headers=headers)
+
+    response.headers.update(headers)
+    return document
+
+@api_router.post(
+    "/v1/swift-codes:batchGet",
+    dependencies=[Depends(admit_read)],
+    response_model=SwiftCodeBatchGetResponse,
+    responses={
+        422: {"description": "Validation error"},
+        500: {"description": "Internal server error"},
+        503: {"description": "Over capacity, retry after Retry-After seconds"}
+    }
+)
+async def batch_get_swift_codes(
+    data: SwiftCodeBatchGetRequest,
+    db: Annotated[AsyncSession, Depends(get_read_db)]
+):
+    """
+    Look up many SWIFT codes in one request
+    - Found codes come back in request order, with branches for headquarters
+    - Unknown or inactive codes are listed under `missing`
+    """
+    return await services.get_swift_codes_batch(db, data.swiftCodes)
+
+@api_router.post(
+    "/v1/swift-codes:validate",
+    dependencies=[Depends(admit_read)],
+    response_model=SwiftCodeValidateResponse,
+    responses={
+        422: {"description": "Validation error"},
+        500: {"description": "Internal server error"},
+        503: {"description": "Over capacity, retry after Retry-After seconds"}
+    }
+)
+async def validate_swift_codes(
+    data: SwiftCodeValidateRequest,
+    db: Annotated[AsyncSession, Depends(get_read_db)]
+):
+    """
+    Check whether SWIFT codes are well-formed and active, results in request order
+    - ISO 9362 structure is checked locally; items may carry `countryISO2`, which
+      must match positions 5-6 of the code
+    - Well-formed codes are checked against the directory, codes the in-memory
+      Bloom filter has never seen are reported `not_found` without a database query
+    """
+    return await services.validate_swift_codes(db, data.swiftCodes)
 
 @api_router.get(
     "/v1/swift-codes/country/{country_code}",
+    dependencies=[Depends(admit_read)],
     response_model=CountrySwiftCodesResponse,
     responses={
+        304: {"description": "Not modified since the ETag in If-None-Match"},
         404: {"description": "No codes found for country"},
-        500: {"description": "Internal server error"}
+        500: {"description": "Internal server error"},
+        503: {"description": "Over capacity, retry after Retry-After seconds"}
     }
 )
 async def get_country_codes(
     country_code: str,
-    db: Annotated[AsyncSession, Depends(get_db)]
+    request: Request,
+    response: Response,
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+    after: Annotated[Optional[str], Query(max_length=11)] = None
 ):
-    return await services.get_swift_codes_by_country(db, country_code)
+    """
+    List active SWIFT codes of a country, ordered by code
+    - `limit`/`after` page through the list by swift_code (keyset pagination),
+      the next page is advertised in the `Link` header
+    - `Accept: application/x-ndjson` streams one SwiftCodeBasic per line
+    - Responses carry ETag/Last-Modified, `If-None-Match` is answered with 304
+    """
+    country_code = country_code.upper()
+    ndjson = "application/x-ndjson" in request.headers.get("accept", "")
+
+    version, updated_at = await versions.get_country_version(db, country_code)
+    variant = f"{limit}|{after}|{ndjson}" if (limit or after or ndjson) else None
+    etag = versions.make_etag(country_code, version, variant)
+    headers = versions.validator_headers(etag, updated_at)
+    if versions.is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if ndjson:
+        lines = services.stream_swift_codes_by_country(db, country_code, limit, after)
+        try:
+            first_line = await lines.__anext__()
+        except StopAsyncIteration:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No SWIFT codes found for country {country_code}"
+            )
+        return AdmittedStreamingResponse(
+            request,
+            _prepend(first_line, lines),
+            media_type="application/x-ndjson",
+            headers=headers
+        )
+
+    # A cursor without a limit still pages, with the largest page size
+    page_size = limit or (MAX_PAGE_SIZE if after else None)
+    if encoding.FAST_JSON:
+        content, next_after = await services.get_swift_codes_page_json(db, country_code, page_size, after)
+        if next_after:
+            headers["Link"] = _next_link(request, next_after)
+        return Response(content=content, media_type="application/json", headers=headers)
+
+    response.headers.update(headers)
+    if page_size is None:
+        return await services.get_swift_codes_by_country(db, country_code)
+
+    page, next_after = await services.get_swift_codes_page(db, country_code, page_size, after)
+    if next_after:
+        response.headers["Link"] = _next_link(request, next_after)
+    return page
+
+def _next_link(request: Request, next_after: str) -> str:
+    return f'<{request.url.include_query_params(after=next_after)}>; rel="next"'
+
+async def _prepend(first, rest):
+    yield first
+    async for item in rest:
+        yield item
 
 @api_router.post(
     "/v1/swift-codes",
+    dependencies=[Depends(admit_write), Depends(remember_write)],
     response_model=SwiftCodeCreateResponse,
     status_code=status.HTTP_201_CREATED,
     responses={
         400: {"description": "SWIFT code already exists"},
         422: {"description": "Validation error"},
-        500: {"description": "Internal server error"}
+        500: {"description": "Internal server error"},
+        503: {"description": "Over capacity, retry after Retry-After seconds"}
     }
 )
 async def create_code(
@@ -86,12 +355,36 @@ async def create_code(
     """
     return await services.create_swift_code(db, data)
 
+@api_router.post(
+    "/v1/swift-codes:batchCreate",
+    dependencies=[Depends(admit_write), Depends(remember_write)],
+    response_model=SwiftCodeBatchCreateResponse,
+    responses={
+        422: {"description": "Validation error"},
+        500: {"description": "Internal server error"},
+        503: {"description": "Over capacity, retry after Retry-After seconds"}
+    }
+)
+async def batch_create_codes(
+    data: SwiftCodeBatchCreateRequest,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    onConflict: Literal["skip", "update"] = "skip"
+):
+    """
+    Create many SWIFT codes in one statement
+    - `onConflict=skip` keeps existing codes, `onConflict=update` overwrites and reactivates them
+    - Each item is reported as created, updated, exists or duplicate (repeated in the request)
+    """
+    return await services.create_swift_codes_batch(db, data.swiftCodes, onConflict)
+
 @api_router.delete(
     "/v1/swift-codes/{swift_code}",
+    dependencies=[Depends(admit_write), Depends(remember_write)],
     response_model=SwiftCodeDeleteResponse,
     responses={
         404: {"description": "SWIFT code not found"},
-        500: {"description": "Internal server error"}
+        500: {"description": "Internal server error"},
+        503: {"description": "Over capacity, retry after Retry-After seconds"}
     }
 )
 async def delete_swift_code(
@@ -105,8 +398,148 @@ async def delete_swift_code(
     """
     return await services.delete_swift_code(db, swift_code)
 
+@api_router.post(
+    "/v1/imports",
+    dependencies=[Depends(admit_write)],
+    response_model=ImportJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        422: {"description": "Validation error"},
+        500: {"description": "Internal server error"},
+        503: {"description": "Over capacity, retry after Retry-After seconds"}
+    }
+)
+async def create_import(
+    response: Response,
+    file: Annotated[UploadFile, File(description="Directory CSV in the Interns_2025_SWIFT_CODES.csv format")],
+    db: Annotated[AsyncSession, Depends(get_db)]
+):
+    """
+    Upload a directory CSV and import it in the background
+    - New codes are inserted, changed or inactive ones updated, identical ones left alone
+    - Poll the job at the `Location` header for progress
+    """
+    job = await import_runner.submit(db, file)
+    response.headers["Location"] = f"/api/v1/imports/{job.id}"
+    return job_response(job)
+
+@api_router.get(
+    "/v1/imports/{job_id}",
+    dependencies=[Depends(admit_read)],
+    response_model=ImportJobResponse,
+    responses={
+        404: {"description": "Import job not found"},
+        500: {"description": "Internal server error"},
+        503: {"description": "Over capacity, retry after Retry-After seconds"}
+    }
+)
+async def get_import(
+    job_id: uuid.UUID,
+    db: Annotated[AsyncSession, Depends(get_db)]
+):
+    """Status, row counts and throughput of an import job"""
+    return await get_import_job(db, job_id)
+
+async def require_admin(x_admin_token: Annotated[Optional[str], Header()] = None):
+    """Admin endpoints answer 404 unless ADMIN_TOKEN is set, 403 on a wrong or missing token"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+@api_router.post(
+    "/v1/admin/purge",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin)],
+    response_model=PurgeResponse,
+    responses={
+        403: {"description": "Invalid admin token"},
+        500: {"description": "Internal server error"}
+    }
+)
+async def purge_soft_deleted_codes(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    olderThanDays: Annotated[Optional[int], Query(ge=0)] = None,
+    batchSize: Annotated[int, Query(ge=1, le=100000)] = settings.swift_purge_batch_size,
+    maxBatches: Annotated[Optional[int], Query(ge=1)] = None
+):
+    """
+    Move codes soft-deleted more than `olderThanDays` days ago (default
+    SWIFT_PURGE_AFTER_DAYS, else 30) into swift_codes_archive, in batches of
+    `batchSize` rows committed one at a time
+    """
+    if olderThanDays is None:
+        olderThanDays = settings.swift_purge_after_days if settings.swift_purge_after_days is not None else 30
+    try:
+        return await maintenance.purge_soft_deleted(db, olderThanDays, batchSize, maxBatches)
+    except SQLAlchemyError:
+        await db.rollback()
+        logger.exception("Purge of soft-deleted codes failed")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to purge soft-deleted codes"
+        )
+
+@api_router.get(
+    "/v1/admin/slow-queries",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin)],
+    response_model=SlowQueriesResponse,
+    responses={403: {"description": "Invalid admin token"}}
+)
+async def get_slow_queries(reset: bool = False):
+    """
+    Slowest statements of this worker since start (or the last reset), normalized and
+    slowest first, with the plan captured for a sample of them. Enabled by SLOW_QUERY_LOG_ENABLED.
+    """
+    queries = [
+        SlowQuery(
+            statement=entry.statement,
+            engine=entry.engine,
+            calls=entry.calls,
+            totalSeconds=round(entry.total, 6),
+            maxSeconds=round(entry.slowest, 6),
+            lastSeenAt=entry.last_seen,
+            plan=entry.plan,
+            planCapturedAt=entry.plan_captured_at
+        )
+        for entry in slow_query_log.entries()
+    ]
+    if reset:
+        slow_query_log.reset()
+    return SlowQueriesResponse(
+        enabled=slow_query_log.enabled,
+        thresholdSeconds=slow_query_log.threshold,
+        queries=queries
+    )
+
 @api_router.get("/health", tags=["Health"])
 async def health_check():
     return JSONResponse(content={"status": "healthy"})
 
-app.include_router(api_router)
\ No newline at end of file
+@api_router.get("/health/live", tags=["Health"])
+async def liveness_check():
+    """The process is up and serving requests"""
+    return JSONResponse(content={"status": "alive"})
+
+@api_router.get(
+    "/health/ready",
+    tags=["Health"],
+    responses={503: {"description": "Starting up or database unreachable"}}
+)
+async def readiness_check(request: Request):
+    """Startup (schema, pool and cache warm-up) finished and the database answers"""
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "starting"})
+    if not await ping_db():
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "database unavailable"})
+    return JSONResponse(content={"status": "ready"})
+
+app.include_router(api_router)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus scrape endpoint, 404 with METRICS_ENABLED=false"""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled")
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .backend import is_postgres
+from .database import AsyncSessionLocal
+from .metrics import registry
+from .models import SwiftCode, SwiftCodeArchive
+
+logger = logging.getLogger(__name__)
+
+PURGED_CODES = registry.counter(
+    "swift_purged_codes_total", "Soft-deleted codes moved from swift_codes to swift_codes_archive"
+)
+
+# One batch: lock a bounded set of old soft-deleted rows (skipping any a concurrent
+# writer holds), delete them and copy the deleted rows into the archive.
+# The candidates come from ix_swift_inactive_updated.
+_PURGE_BATCH = text("""
+    WITH candidates AS (
+        SELECT id FROM swift_codes
+        WHERE NOT is_active AND updated_at < now() - make_interval(days => :older_than_days)
+        ORDER BY updated_at
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    ), purged AS (
+        DELETE FROM swift_codes s
+        USING candidates c
+        WHERE s.id = c.id AND NOT s.is_active
+        RETURNING s.id, s.swift_code, s.bank_code, s.country_iso2, s.code_type, s.bank_name,
+                  s.address, s.town_name, s.country_name, s.time_zone, s.is_headquarter,
+                  s.content_hash, s.created_at, s.updated_at
+    )
+    INSERT INTO swift_codes_archive (
+        id, swift_code, bank_code, country_iso2, code_type, bank_name,
+        address, town_name, country_name, time_zone, is_headquarter,
+        content_hash, created_at, updated_at, archived_at
+    )
+    SELECT purged.*, now() FROM purged
+""")
+
+_ARCHIVED_COLUMNS = [c.name for c in SwiftCodeArchive.__table__.c if c.name != "archived_at"]
+
+async def _purge_batch(db: AsyncSession, older_than_days: int, batch_size: int) -> int:
+    if is_postgres(db):
+        result = await db.execute(_PURGE_BATCH, {"older_than_days": older_than_days, "batch_size": batch_size})
+        return result.rowcount or 0
+
+    # Same batch in three statements, the transaction holds SQLite's single write lock
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    ids = (await db.execute(
+        select(SwiftCode.id)
+        .where(SwiftCode.is_active == False, SwiftCode.updated_at < cutoff)
+        .order_by(SwiftCode.updated_at)
+        .limit(batch_size)
+    )).scalars().all()
+    if ids:
+        await db.execute(insert(SwiftCodeArchive).from_select(
+            _ARCHIVED_COLUMNS,
+            select(*(SwiftCode.__table__.c[name] for name in _ARCHIVED_COLUMNS)).where(SwiftCode.id.in_(ids))
+        ))
+        await db.execute(delete(SwiftCode).where(SwiftCode.id.in_(ids)))
+    return len(ids)
+
+async def purge_soft_deleted(
+    db: AsyncSession,
+    older_than_days: int,
+    batch_size: int = 1000,
+    max_batches: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Moves codes soft-deleted more than `older_than_days` ago into swift_codes_archive.
+
+    Works in batches of at most `batch_size` rows, each in its own short transaction,
+    so row locks are held briefly and autovacuum can reclaim space as it goes. Stops
+    when nothing is left or after `max_batches`. Soft-deleted rows are invisible to
+    every read, caches and versions are not touched.
+    """
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        count = await _purge_batch(db, older_than_days, batch_size)
+        await db.commit()
+        if count == 0:
+            break
+        archived += count
+        batches += 1
+        PURGED_CODES.inc(count)
+        if count < batch_size:
+            break
+
+    if archived:
+        logger.info(f"Archived {archived} codes soft-deleted over {older_than_days} days ago in {batches} batch(es)")
+    return {"archived": archived, "batches": batches}
+
+async def run_purge_job(older_than_days: int, interval: float, batch_size: int):
+    """Background loop for the lifespan, purges every `interval` seconds until cancelled"""
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                await purge_soft_deleted(session, older_than_days, batch_size)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Next round retries, a failed batch was rolled back with its session
+            logger.error(f"Purge of soft-deleted codes failed: {e!r}")
+        await asyncio.sleep(interval)
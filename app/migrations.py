@@ -0,0 +1,118 @@
+import logging
+from typing import Awaitable, Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, String, Table, insert, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.sql import func
+
+from .backend import is_postgres
+from .database import Base, engine
+from . import models  # noqa: F401 - registers all tables on Base.metadata
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary constant shared by all replicas, serializes concurrent bootstraps
+MIGRATION_LOCK_KEY = 0x5317C0DE
+
+schema_migrations = Table(
+    "schema_migrations",
+    Base.metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime, server_default=func.now())
+)
+
+def _postgres_only(step: Callable[[AsyncConnection], Awaitable[None]]):
+    # Upgrades of databases older than SQLite support, there the baseline is already current
+    async def run(conn: AsyncConnection):
+        if is_postgres(conn):
+            await step(conn)
+    return run
+
+async def _baseline(conn: AsyncConnection):
+    # Creates whatever is missing and leaves existing tables and data alone
+    await conn.run_sync(Base.metadata.create_all, checkfirst=True)
+
+@_postgres_only
+async def _bank_code_and_content_hash(conn: AsyncConnection):
+    # Tables created before bank_code/content_hash existed, no-ops on fresh databases
+    await conn.execute(text("ALTER TABLE swift_codes ADD COLUMN IF NOT EXISTS bank_code varchar(8)"))
+    await conn.execute(text("UPDATE swift_codes SET bank_code = left(swift_code, 8) WHERE bank_code IS NULL"))
+    await conn.execute(text("ALTER TABLE swift_codes ALTER COLUMN bank_code SET NOT NULL"))
+    await conn.execute(text("ALTER TABLE swift_codes ADD COLUMN IF NOT EXISTS content_hash varchar(32)"))
+    await conn.execute(text("DROP INDEX IF EXISTS ix_swift_branches"))
+    await conn.execute(text("CREATE INDEX ix_swift_branches ON swift_codes (bank_code, swift_code)"))
+
+@_postgres_only
+async def _search_indexes(conn: AsyncConnection):
+    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_swift_code_prefix ON swift_codes (swift_code varchar_pattern_ops)"
+    ))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_swift_bank_name_trgm ON swift_codes USING gin (bank_name gin_trgm_ops)"
+    ))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_swift_town_name_trgm ON swift_codes USING gin (town_name gin_trgm_ops)"
+    ))
+
+@_postgres_only
+async def _partial_indexes_and_archive(conn: AsyncConnection):
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_swift_active_country ON swift_codes (country_iso2, swift_code) WHERE is_active"
+    ))
+    await conn.execute(text("DROP INDEX IF EXISTS ix_swift_codes_country_iso2"))
+    await conn.execute(text("DROP INDEX IF EXISTS ix_swift_branches"))
+    await conn.execute(text(
+        "CREATE INDEX ix_swift_branches ON swift_codes (bank_code, swift_code) WHERE is_active"
+    ))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_swift_inactive_updated ON swift_codes (updated_at) WHERE NOT is_active"
+    ))
+    await conn.run_sync(models.SwiftCodeArchive.__table__.create, checkfirst=True)
+
+async def _change_log(conn: AsyncConnection):
+    await conn.run_sync(models.SwiftCodeChange.__table__.create, checkfirst=True)
+
+async def _import_jobs(conn: AsyncConnection):
+    await conn.run_sync(models.ImportJob.__table__.create, checkfirst=True)
+
+async def _import_job_heartbeat(conn: AsyncConnection):
+    # Also on SQLite, import_jobs predates SQLite support. SQLite has no ADD COLUMN IF NOT EXISTS.
+    columns = await conn.run_sync(lambda sync: {c["name"] for c in inspect(sync).get_columns("import_jobs")})
+    if "heartbeat_at" not in columns:
+        await conn.execute(text("ALTER TABLE import_jobs ADD COLUMN heartbeat_at timestamp"))
+
+# Append only. Every step must be idempotent, a fresh database runs all of them
+# right after the baseline has already created the current model.
+MIGRATIONS: List[Tuple[int, str, Callable[[AsyncConnection], Awaitable[None]]]] = [
+    (1, "baseline schema", _baseline),
+    (2, "swift_codes.bank_code and content_hash", _bank_code_and_content_hash),
+    (3, "pg_trgm search indexes", _search_indexes),
+    (4, "partial indexes on active rows, swift_codes_archive", _partial_indexes_and_archive),
+    (5, "swift_code_changes change log", _change_log),
+    (6, "import_jobs", _import_jobs),
+    (7, "import_jobs.heartbeat_at", _import_job_heartbeat),
+]
+
+async def init_db():
+    """
+    Brings the schema up to the latest version without dropping anything.
+    Applied versions are recorded in schema_migrations, so restarts are a single
+    SELECT. Runs in one transaction under an advisory lock, replicas starting
+    together wait for each other instead of racing (SQLite locks the whole file anyway).
+    """
+    async with engine.begin() as conn:
+        if is_postgres(conn):
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        await conn.run_sync(schema_migrations.create, checkfirst=True)
+        applied = set((await conn.execute(select(schema_migrations.c.version))).scalars())
+
+        for version, description, step in MIGRATIONS:
+            if version in applied:
+                continue
+            await step(conn)
+            await conn.execute(insert(schema_migrations).values(version=version, description=description))
+            logger.info(f"Applied schema migration {version}: {description}")
+
+    logger.info(f"Database schema at version {MIGRATIONS[-1][0]}")
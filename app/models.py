@@ -1,15 +1,41 @@
-from sqlalchemy import Column, String, Boolean, DateTime, Index
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Boolean, DateTime, Index, Integer, BigInteger, Uuid, DDL, event, text
+import hashlib
 import uuid
 from sqlalchemy.sql import func
 from .database import Base
 
+def _bank_code_default(context):
+    # First 8 characters of a BIC identify the institution (bank + country + location)
+    return context.get_current_parameters()["swift_code"][:8]
+
+# Fields that make up a row's content, code_type is derived from is_headquarter
+CONTENT_HASH_FIELDS = (
+    'country_iso2',
+    'bank_name',
+    'address',
+    'town_name',
+    'country_name',
+    'time_zone',
+    'is_headquarter'
+)
+
+def compute_content_hash(values) -> str:
+    payload = "\x1f".join(
+        "" if values.get(field) is None else str(values[field])
+        for field in CONTENT_HASH_FIELDS
+    )
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+def _content_hash_default(context):
+    return compute_content_hash(context.get_current_parameters())
+
 class SwiftCode(Base):
     __tablename__ = "swift_codes"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    country_iso2 = Column(String(2), nullable=False, index=True)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    country_iso2 = Column(String(2), nullable=False)
     swift_code = Column(String(11), nullable=False, unique=True, index=True)
+    bank_code = Column(String(8), nullable=False, default=_bank_code_default)
     code_type = Column(String(20), nullable=False)
     bank_name = Column(String(255), nullable=False)
     address = Column(String(512), nullable=False)
@@ -18,9 +44,85 @@ class SwiftCode(Base):
     time_zone = Column(String(50))
     is_headquarter = Column(Boolean, nullable=False, default=False, index=True)
     is_active = Column(Boolean, nullable=False, default=True)
+    content_hash = Column(String(32), default=_content_hash_default)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
 
     __table_args__ = (
-        Index('ix_swift_branches', 'swift_code', 'is_headquarter'),
-    )
\ No newline at end of file
+        # Reads only ever look at active rows, soft-deleted ones stay out of these indexes
+        Index('ix_swift_active_country', 'country_iso2', 'swift_code', postgresql_where=text('is_active'), sqlite_where=text('is_active')),
+        Index('ix_swift_branches', 'bank_code', 'swift_code', postgresql_where=text('is_active'), sqlite_where=text('is_active')),
+        # Purge candidates, soft-deleted rows by the time of deletion
+        Index('ix_swift_inactive_updated', 'updated_at', postgresql_where=text('NOT is_active'), sqlite_where=text('NOT is_active')),
+        # Search: LIKE 'PREFIX%' on codes, pg_trgm word similarity on names
+        Index('ix_swift_code_prefix', 'swift_code', postgresql_ops={'swift_code': 'varchar_pattern_ops'}),
+        Index('ix_swift_bank_name_trgm', 'bank_name', postgresql_using='gin', postgresql_ops={'bank_name': 'gin_trgm_ops'}),
+        Index('ix_swift_town_name_trgm', 'town_name', postgresql_using='gin', postgresql_ops={'town_name': 'gin_trgm_ops'}),
+    )
+
+# gin_trgm_ops has to exist before the indexes above are created
+event.listen(
+    SwiftCode.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
+class SwiftCodeArchive(Base):
+    """Soft-deleted codes moved out of swift_codes by the purge job, a code may be archived more than once"""
+    __tablename__ = "swift_codes_archive"
+
+    id = Column(Uuid, primary_key=True)
+    swift_code = Column(String(11), nullable=False, index=True)
+    bank_code = Column(String(8), nullable=False)
+    country_iso2 = Column(String(2), nullable=False)
+    code_type = Column(String(20), nullable=False)
+    bank_name = Column(String(255), nullable=False)
+    address = Column(String(512), nullable=False)
+    town_name = Column(String(100))
+    country_name = Column(String(100), nullable=False)
+    time_zone = Column(String(50))
+    is_headquarter = Column(Boolean, nullable=False)
+    content_hash = Column(String(32))
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, nullable=False, server_default=func.now())
+
+class SwiftCodeChange(Base):
+    """
+    Append-only log of writes to swift_codes, read by the change feed. seq is handed
+    out under an advisory lock (see app/changes.py), so it also follows commit order.
+    """
+    __tablename__ = "swift_code_changes"
+
+    # SQLite only autoincrements an INTEGER PRIMARY KEY
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    swift_code = Column(String(11), nullable=False)
+    country_iso2 = Column(String(2), nullable=False)
+    operation = Column(String(10), nullable=False)  # insert | update | delete
+    changed_at = Column(DateTime, nullable=False, server_default=func.now())
+
+class ImportJob(Base):
+    """Progress of a background CSV import, written with every committed batch"""
+    __tablename__ = "import_jobs"
+
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    filename = Column(String(255))
+    status = Column(String(20), nullable=False, default="queued")  # queued | running | succeeded | failed
+    rows_processed = Column(Integer, nullable=False, default=0)
+    rows_rejected = Column(Integer, nullable=False, default=0)
+    rows_inserted = Column(Integer, nullable=False, default=0)
+    rows_updated = Column(Integer, nullable=False, default=0)
+    error = Column(String(1024))
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    # Refreshed by the worker owning the job, a stale one means that worker is gone
+    heartbeat_at = Column(DateTime)
+
+class CountryVersion(Base):
+    """Change counter per country, bumped by every write that touches the country's codes"""
+    __tablename__ = "country_versions"
+
+    country_iso2 = Column(String(2), primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime, nullable=False)
@@ -0,0 +1,174 @@
+import logging
+import random
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .config import settings
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES = registry.counter(
+    "db_slow_queries_total", "Statements that ran longer than SLOW_QUERY_THRESHOLD", ("engine",)
+)
+SLOW_QUERY_EXPLAINS = registry.counter(
+    "db_slow_query_explains_total", "Plans captured for sampled slow statements, by outcome", ("engine", "outcome")
+)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+# asyncpg $1, sqlite ?, psycopg %(name)s; not :name, that would also eat ::casts
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|\?")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_statement(statement: str) -> str:
+    """
+    Statement text with literals and bind parameters as ?, IN lists and multi-row VALUES
+    collapsed to (...), so every execution of one query lands on the same entry
+    """
+    normalized = _STRING.sub("?", statement)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _LIST.sub("(...)", normalized)
+    normalized = _ROWS.sub("(...)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+@dataclass
+class SlowQuery:
+    statement: str
+    engine: str
+    calls: int = 0
+    total: float = 0.0
+    slowest: float = 0.0
+    last_seen: Optional[datetime] = None
+    plan: Optional[str] = None
+    plan_captured_at: Optional[datetime] = None
+
+
+class SlowQueryLog:
+    """
+    Statements slower than `threshold` seconds, grouped by normalized text. Only the
+    `size` slowest entries are kept: a new statement takes the place of the fastest one
+    or is dropped if it is faster still. For an `explain_sample_rate` share of slow
+    SELECTs the plan is captured right away, on the same connection and inside the same
+    transaction, with EXPLAIN on PostgreSQL and EXPLAIN QUERY PLAN on SQLite. Neither
+    runs the query: a SELECT may call pg_notify() or take advisory locks, which must not
+    happen twice. Plans carry the planner's estimates, not actual row counts or timings.
+    """
+
+    def __init__(self, enabled: bool, threshold: float, size: int, explain_sample_rate: float):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.size = size
+        self.explain_sample_rate = explain_sample_rate
+        self._entries: Dict[str, SlowQuery] = {}
+
+    def attach(self, engine: AsyncEngine, name: str):
+        """Times every statement run on `engine`, a no-op unless enabled"""
+        if not self.enabled:
+            return
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._slow_query_started = time.perf_counter()
+
+        @event.listens_for(engine.sync_engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, "_slow_query_started", None)
+            if started is None:
+                return
+            duration = time.perf_counter() - started
+            if duration < self.threshold:
+                return
+            entry = self.record(name, statement, duration)
+            if entry is not None and not executemany and self._should_explain(statement, context):
+                self._capture_plan(conn, entry, statement, parameters)
+
+    def record(self, engine_name: str, statement: str, duration: float) -> Optional[SlowQuery]:
+        """Adds one slow execution, returns its entry or None when it didn't make the slowest `size`"""
+        SLOW_QUERIES.inc(engine=engine_name)
+        normalized = normalize_statement(statement)
+        logger.warning(f"Slow query on {engine_name} ({duration * 1000:.1f} ms): {normalized[:500]}")
+
+        entry = self._entries.get(normalized)
+        if entry is None:
+            if len(self._entries) >= self.size:
+                fastest = min(self._entries.values(), key=lambda e: e.slowest)
+                if fastest.slowest >= duration:
+                    return None
+                del self._entries[fastest.statement]
+            entry = self._entries[normalized] = SlowQuery(normalized, engine_name)
+        entry.calls += 1
+        entry.total += duration
+        entry.slowest = max(entry.slowest, duration)
+        entry.last_seen = datetime.utcnow()
+        return entry
+
+    def _should_explain(self, statement: str, context) -> bool:
+        # Plans of reads only, and not while a server-side cursor of the original
+        # statement is still being read on the same connection
+        if statement.lstrip()[:6].upper() != "SELECT":
+            return False
+        if context.execution_options.get("stream_results"):
+            return False
+        return random.random() < self.explain_sample_rate
+
+    def _capture_plan(self, conn, entry: SlowQuery, statement: str, parameters):
+        dialect = conn.dialect.name
+        if dialect == "postgresql":
+            prefix = "EXPLAIN "
+        elif dialect == "sqlite":
+            prefix = "EXPLAIN QUERY PLAN "
+        else:
+            return
+
+        # Straight on the driver connection, so the EXPLAIN itself isn't timed or logged.
+        # On PostgreSQL a failed statement aborts the transaction, a savepoint keeps the
+        # caller's transaction usable.
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            if dialect == "postgresql":
+                cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(prefix + statement, parameters)
+                rows = cursor.fetchall()
+            except Exception as e:
+                if dialect == "postgresql":
+                    cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                SLOW_QUERY_EXPLAINS.inc(engine=entry.engine, outcome="failed")
+                logger.debug(f"EXPLAIN of a slow query failed: {e!r}")
+                return
+            if dialect == "postgresql":
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        finally:
+            cursor.close()
+
+        # PostgreSQL returns one plan line per row, SQLite (id, parent, notused, detail)
+        entry.plan = "\n".join(str(row[-1]) for row in rows)
+        entry.plan_captured_at = datetime.utcnow()
+        SLOW_QUERY_EXPLAINS.inc(engine=entry.engine, outcome="captured")
+
+    def entries(self) -> List[SlowQuery]:
+        """Kept statements, slowest first"""
+        return sorted(self._entries.values(), key=lambda e: e.slowest, reverse=True)
+
+    def reset(self):
+        self._entries.clear()
+
+
+slow_query_log = SlowQueryLog(
+    enabled=settings.slow_query_log_enabled,
+    threshold=settings.slow_query_threshold,
+    size=settings.slow_query_log_size,
+    explain_sample_rate=settings.slow_query_explain_sample_rate
+)
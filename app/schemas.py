@@ -1,6 +1,14 @@
 from pydantic import BaseModel, Field, ConfigDict
 from datetime import datetime
-from typing import List, Optional, Union
+from typing import List, Literal, Optional, Union
+
+MAX_BATCH_CODES = 1000
+MAX_PAGE_SIZE = 1000
+MAX_SEARCH_RESULTS = 100
+MAX_VALIDATE_CODES = 10000
+MAX_CHANGES_PAGE = 1000
+# Seconds a change feed poll may wait for new changes
+MAX_CHANGES_WAIT = 30
 
 class SwiftCodeBasic(BaseModel):
     swiftCode: str = Field(..., min_length=8, max_length=11)
@@ -36,4 +44,97 @@ class SwiftCodeCreateResponse(BaseModel):
     message: str
 
 class SwiftCodeDeleteResponse(BaseModel):
-    message: str
\ No newline at end of file
+    message: str
+
+class SwiftCodeBatchGetRequest(BaseModel):
+    swiftCodes: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_CODES)
+
+class SwiftCodeBatchGetResponse(BaseModel):
+    swiftCodes: List[SwiftCodeWithBranches]
+    missing: List[str]
+
+class SwiftCodeBatchCreateRequest(BaseModel):
+    swiftCodes: List[SwiftCodeCreate] = Field(..., min_length=1, max_length=MAX_BATCH_CODES)
+
+class SwiftCodeBatchCreateItem(BaseModel):
+    swiftCode: str
+    status: Literal["created", "updated", "exists", "duplicate"]
+
+class SwiftCodeBatchCreateResponse(BaseModel):
+    results: List[SwiftCodeBatchCreateItem]
+
+class SwiftCodeSearchResult(SwiftCodeBasic):
+    countryName: str
+    townName: Optional[str] = None
+    score: float
+
+class SwiftCodeSearchResponse(BaseModel):
+    results: List[SwiftCodeSearchResult]
+
+class SwiftCodeValidateItem(BaseModel):
+    swiftCode: str
+    countryISO2: Optional[str] = None
+
+class SwiftCodeValidateRequest(BaseModel):
+    # Plain codes, or objects also carrying the country the code is expected to belong to
+    swiftCodes: List[Union[str, SwiftCodeValidateItem]] = Field(..., min_length=1, max_length=MAX_VALIDATE_CODES)
+
+class SwiftCodeValidateResult(BaseModel):
+    swiftCode: str
+    valid: bool
+    status: Literal["active", "not_found", "invalid_format", "country_mismatch"]
+    detail: Optional[str] = None
+
+class SwiftCodeValidateResponse(BaseModel):
+    results: List[SwiftCodeValidateResult]
+
+class SwiftCodeChange(BaseModel):
+    seq: int
+    swiftCode: str
+    countryISO2: str
+    operation: Literal["insert", "update", "delete"]
+    changedAt: datetime
+    # Current state of the code, null once it is no longer active
+    record: Optional[SwiftCodeBasic] = None
+
+class SwiftCodeChangesResponse(BaseModel):
+    changes: List[SwiftCodeChange]
+    # Cursor for the next poll, the last returned seq (or `since` when nothing changed)
+    nextSince: int
+    hasMore: bool
+
+class PurgeResponse(BaseModel):
+    archived: int
+    batches: int
+
+class SlowQuery(BaseModel):
+    # Normalized text, literals and bind parameters replaced by ?
+    statement: str
+    engine: str
+    calls: int
+    totalSeconds: float
+    maxSeconds: float
+    lastSeenAt: datetime
+    plan: Optional[str] = None
+    planCapturedAt: Optional[datetime] = None
+
+class SlowQueriesResponse(BaseModel):
+    enabled: bool
+    thresholdSeconds: float
+    queries: List[SlowQuery]
+
+class ImportJobResponse(BaseModel):
+    id: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    filename: Optional[str] = None
+    rowsProcessed: int
+    rowsRejected: int
+    rowsInserted: int
+    rowsUpdated: int
+    # Valid rows that matched the stored content, or repeated a code of the same batch
+    rowsUnchanged: int
+    rowsPerSecond: Optional[float] = None
+    error: Optional[str] = None
+    createdAt: Optional[datetime] = None
+    startedAt: Optional[datetime] = None
+    finishedAt: Optional[datetime] = None
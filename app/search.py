@@ -0,0 +1,159 @@
+import re
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, and_, or_, case, func, literal, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import SwiftCode
+
+# Same default as pg_trgm.word_similarity_threshold, so both backends return the same hits
+WORD_SIMILARITY_THRESHOLD = 0.6
+# Score of a term that is a prefix of the SWIFT code, above any fuzzy match
+CODE_PREFIX_SCORE = 1.5
+MAX_SEARCH_TERMS = 5
+
+_WORD = re.compile(r"\w+")
+_CODE_PREFIX = re.compile(r"^[A-Z0-9]{1,11}$")
+
+def search_terms(query: str) -> List[str]:
+    """Upper-cased words of the query, at most MAX_SEARCH_TERMS"""
+    return [term.upper() for term in _WORD.findall(query)][:MAX_SEARCH_TERMS]
+
+def trigrams(word: str) -> Set[str]:
+    """pg_trgm style trigrams of a single word: lower-cased, two spaces before and one after"""
+    padded = f"  {word.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def word_similarity(term: str, text: Optional[str]) -> float:
+    """
+    Share of the term's trigrams found in the best matching word of `text`. Close to
+    pg_trgm's word_similarity(), which also scores prefixes of a word highly.
+    """
+    if not text:
+        return 0.0
+    term_trigrams = trigrams(term)
+    return max(
+        (len(term_trigrams & trigrams(word)) / len(term_trigrams) for word in _WORD.findall(text)),
+        default=0.0
+    )
+
+
+class NgramIndex:
+    """
+    Trigram index over the bank and town names of a DirectorySnapshot, plus a sorted list
+    of all codes for prefix lookups. Names are shared by many branches, so trigrams point
+    at distinct names and each name at the codes carrying it.
+    """
+
+    def __init__(self, records: Iterable = ()):
+        self.codes: List[str] = []
+        self._names_by_trigram: Dict[str, Set[str]] = {}
+        self._codes_by_name: Dict[str, Set[str]] = {}
+        for record in records:
+            self.add(record)
+
+    def _names(self, record) -> Tuple[str, ...]:
+        return tuple(name for name in (record.bank_name, record.town_name) if name)
+
+    def add(self, record):
+        insort(self.codes, record.swift_code)
+        for name in self._names(record):
+            codes = self._codes_by_name.get(name)
+            if codes is None:
+                codes = self._codes_by_name[name] = set()
+                for word in _WORD.findall(name):
+                    for trigram in trigrams(word):
+                        self._names_by_trigram.setdefault(trigram, set()).add(name)
+            codes.add(record.swift_code)
+
+    def discard(self, record):
+        pos = bisect_left(self.codes, record.swift_code)
+        if pos < len(self.codes) and self.codes[pos] == record.swift_code:
+            del self.codes[pos]
+        # Names without codes stay in the trigram map, they no longer produce candidates
+        for name in self._names(record):
+            self._codes_by_name.get(name, set()).discard(record.swift_code)
+
+    def with_prefix(self, prefix: str) -> List[str]:
+        start = bisect_left(self.codes, prefix)
+        end = bisect_left(self.codes, prefix + "\x7f", start)
+        return self.codes[start:end]
+
+    def fuzzy(self, term: str) -> Set[str]:
+        """Codes whose bank or town name has a word similar to `term`"""
+        term_trigrams = trigrams(term)
+        hits: Dict[str, int] = {}
+        for trigram in term_trigrams:
+            for name in self._names_by_trigram.get(trigram, ()):
+                hits[name] = hits.get(name, 0) + 1
+
+        needed = WORD_SIMILARITY_THRESHOLD * len(term_trigrams)
+        codes = set()
+        for name, count in hits.items():
+            # Trigram counts across the whole name are an upper bound, verify per word
+            if count >= needed and word_similarity(term, name) >= WORD_SIMILARITY_THRESHOLD:
+                codes.update(self._codes_by_name[name])
+        return codes
+
+
+def _term_score(term: str, record) -> float:
+    if record.swift_code.startswith(term):
+        return CODE_PREFIX_SCORE
+    return max(word_similarity(term, record.bank_name), word_similarity(term, record.town_name))
+
+def search_snapshot(snapshot, terms: List[str], country: Optional[str], limit: int) -> List[Tuple[object, float]]:
+    """(record, score) of codes matching every term, best first"""
+    index = snapshot.search_index()
+    candidates: Optional[Set[str]] = None
+    for term in terms:
+        matches = index.fuzzy(term)
+        if _CODE_PREFIX.match(term):
+            matches.update(index.with_prefix(term))
+        candidates = matches if candidates is None else candidates & matches
+        if not candidates:
+            return []
+
+    scored = []
+    for code in candidates:
+        record = snapshot.get(code)
+        if record is None or (country and record.country_iso2 != country):
+            continue
+        scored.append((record, sum(_term_score(term, record) for term in terms)))
+    scored.sort(key=lambda hit: (-hit[1], hit[0].swift_code))
+    return scored[:limit]
+
+async def search_database(db: AsyncSession, terms: List[str], country: Optional[str], limit: int) -> List[Tuple[object, float]]:
+    """
+    pg_trgm search: `term <% name` is answered from the GIN trigram indexes and the code
+    prefix from ix_swift_code_prefix, so every term is a bitmap index scan
+    """
+    conditions = []
+    scores = []
+    for term in terms:
+        fuzzy = [literal(term).op("<%")(SwiftCode.bank_name), literal(term).op("<%")(SwiftCode.town_name)]
+        similarity = func.greatest(
+            func.word_similarity(term, SwiftCode.bank_name),
+            func.coalesce(func.word_similarity(term, SwiftCode.town_name), 0)
+        )
+        if _CODE_PREFIX.match(term):
+            prefix = SwiftCode.swift_code.like(term + "%")
+            conditions.append(or_(prefix, *fuzzy))
+            scores.append(case((prefix, CODE_PREFIX_SCORE), else_=similarity))
+        else:
+            conditions.append(or_(*fuzzy))
+            scores.append(similarity)
+
+    score = sum(scores[1:], scores[0]).label("score")
+    query = (
+        select(SwiftCode, score)
+        .where(SwiftCode.is_active == True)
+        .where(and_(*conditions))
+        .order_by(desc("score"), SwiftCode.swift_code)
+        .limit(limit)
+    )
+    if country:
+        query = query.where(SwiftCode.country_iso2 == country)
+
+    result = await db.execute(query)
+    return [(row.SwiftCode, float(row.score)) for row in result]
@@ -1,128 +1,664 @@
-from sqlalchemy import select, and_
+import asyncio
+import re
+import uuid
+from bisect import bisect_right
+from sqlalchemy import select, and_, or_, func
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException, status
 from .database import AsyncSession
-from .models import SwiftCode
-from .schemas import SwiftCodeBasic, SwiftCodeWithBranches, CountrySwiftCodesResponse, SwiftCodeCreate
+from . import encoding
+from .models import SwiftCode, SwiftCodeChange, compute_content_hash
+from .schemas import (
+    SwiftCodeBasic,
+    SwiftCodeWithBranches,
+    CountrySwiftCodesResponse,
+    SwiftCodeCreate,
+    SwiftCodeBatchGetResponse,
+    SwiftCodeBatchCreateItem,
+    SwiftCodeBatchCreateResponse,
+    SwiftCodeSearchResult,
+    SwiftCodeSearchResponse,
+    SwiftCodeValidateItem,
+    SwiftCodeValidateResult,
+    SwiftCodeValidateResponse,
+    SwiftCodeChange as SwiftCodeChangeItem,
+    SwiftCodeChangesResponse
+)
+from .cache import DirectoryRecord, DirectorySnapshot, swift_code_cache
+from .directory_file import mapped_directory
+from .bloom import active_code_filter, VALIDATED_CODES
+from .versions import bump_country_versions, stored_countries
+from .changes import record_changes, change_notifier
+from .singleflight import SingleFlight
+from .config import settings
+from . import backend, search, export
 
-async def get_swift_code(db: AsyncSession, swift_code: str):
-    try:
-        result = await db.execute(
+STREAM_CHUNK_SIZE = 500
+# Rows fetched from the export cursor and encoded per chunk
+EXPORT_CHUNK_SIZE = 2000
+
+# Concurrent identical lookups share one query and one response object
+lookups = SingleFlight("lookups", enabled=settings.swift_singleflight_enabled)
+
+def _to_basic(record) -> SwiftCodeBasic:
+    return SwiftCodeBasic(
+        swiftCode=record.swift_code,
+        bankName=record.bank_name,
+        address=record.address,
+        countryISO2=record.country_iso2,
+        isHeadquarter=record.is_headquarter
+    )
+
+async def _find_swift_code(db: AsyncSession, swift_code: str):
+    """Returns (record, branches) from the snapshot when enabled, otherwise from the DB"""
+    if swift_code_cache.enabled:
+        snapshot = await swift_code_cache.snapshot(db)
+        main_record = snapshot.get(swift_code)
+        if main_record and main_record.is_headquarter:
+            return main_record, snapshot.branches_of(main_record)
+        return main_record, []
+
+    directory = mapped_directory.reader()
+    if directory is not None:
+        main_record = directory.get(swift_code)
+        if main_record and main_record.is_headquarter:
+            return main_record, directory.branches_of(main_record)
+        return main_record, []
+
+    # HQ record and its branches share bank_code, so one range scan on ix_swift_branches
+    # returns both, with the requested code sorted first. Branches are only fetched
+    # along when the code looks like a headquarter (BIC8 or "XXX" branch part).
+    may_be_headquarter = len(swift_code) == 8 or swift_code.endswith("XXX")
+    criteria = SwiftCode.swift_code == swift_code
+    if may_be_headquarter:
+        criteria = or_(criteria, SwiftCode.is_headquarter == False)
+
+    result = await db.execute(
+        select(SwiftCode)
+        .where(SwiftCode.bank_code == swift_code[:8])
+        .where(SwiftCode.is_active == True)
+        .where(criteria)
+        .order_by((SwiftCode.swift_code == swift_code).desc(), SwiftCode.swift_code)
+    )
+    rows = result.scalars().all()
+    if not rows or rows[0].swift_code != swift_code:
+        return None, []
+
+    main_record = rows[0]
+    if not main_record.is_headquarter:
+        return main_record, []
+    if may_be_headquarter:
+        return main_record, rows[1:]
+
+    branches_result = await db.execute(
+        select(SwiftCode)
+        .where(SwiftCode.bank_code == main_record.bank_code)
+        .where(SwiftCode.is_headquarter == False)
+        .where(SwiftCode.is_active == True)
+        .order_by(SwiftCode.swift_code)
+    )
+    return main_record, branches_result.scalars().all()
+
+async def _find_country_codes(db: AsyncSession, country_code: str, limit: int = None, after: str = None):
+    """Active codes of a country ordered by swift_code, optionally the keyset page after `after`"""
+    if swift_code_cache.enabled:
+        snapshot = await swift_code_cache.snapshot(db)
+        codes = snapshot.by_country.get(country_code, [])
+        start = bisect_right(codes, after) if after else 0
+        end = start + limit if limit else len(codes)
+        return [snapshot.by_code[c] for c in codes[start:end]]
+
+    directory = mapped_directory.reader()
+    if directory is not None:
+        return directory.country(country_code, limit, after)
+
+    query = (
+        select(SwiftCode)
+        .where(SwiftCode.country_iso2 == country_code)
+        .where(SwiftCode.is_active == True)
+        .order_by(SwiftCode.swift_code)
+    )
+    if after:
+        query = query.where(SwiftCode.swift_code > after)
+    if limit:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+async def _find_swift_codes(db: AsyncSession, swift_codes: list):
+    """Returns {code: (record, branches)} for the active codes among swift_codes"""
+    if swift_code_cache.enabled:
+        snapshot = await swift_code_cache.snapshot(db)
+        found = {}
+        for code in swift_codes:
+            record = snapshot.get(code)
+            if record:
+                found[code] = (record, snapshot.branches_of(record) if record.is_headquarter else [])
+        return found
+
+    directory = mapped_directory.reader()
+    if directory is not None:
+        found = {}
+        for code in swift_codes:
+            record = directory.get(code)
+            if record:
+                found[code] = (record, directory.branches_of(record) if record.is_headquarter else [])
+        return found
+
+    result = await db.execute(
+        select(SwiftCode)
+        .where(backend.in_values(db, SwiftCode.swift_code, swift_codes, "codes"))
+        .where(SwiftCode.is_active == True)
+    )
+    records = result.scalars().all()
+
+    bank_codes = list({r.bank_code for r in records if r.is_headquarter})
+    branches_by_bank = {}
+    if bank_codes:
+        branches_result = await db.execute(
             select(SwiftCode)
-            .where(SwiftCode.swift_code == swift_code.upper())
+            .where(backend.in_values(db, SwiftCode.bank_code, bank_codes, "bank_codes"))
+            .where(SwiftCode.is_headquarter == False)
             .where(SwiftCode.is_active == True)
+            .order_by(SwiftCode.bank_code, SwiftCode.swift_code)
         )
-        main_record = result.scalars().first()
+        for branch in branches_result.scalars():
+            branches_by_bank.setdefault(branch.bank_code, []).append(branch)
 
-        if not main_record:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"SWIFT code {swift_code} not found"
-            )
+    return {
+        r.swift_code: (r, branches_by_bank.get(r.bank_code, []) if r.is_headquarter else [])
+        for r in records
+    }
 
-        base_data = SwiftCodeBasic(
-            swiftCode=main_record.swift_code,
-            bankName=main_record.bank_name,
-            address=main_record.address,
-            countryISO2=main_record.country_iso2,
-            isHeadquarter=main_record.is_headquarter
-        )
-
-        if main_record.is_headquarter:
-            branches_result = await db.execute(
-                select(SwiftCode)
-                .where(SwiftCode.swift_code.like(f"{main_record.swift_code[:8]}%"))
-                .where(SwiftCode.swift_code != main_record.swift_code)
-                .where(SwiftCode.is_headquarter == False)
-                .where(SwiftCode.is_active == True)
-            )
-            branches = [
-                SwiftCodeBasic(
-                    swiftCode=b.swift_code,
-                    bankName=b.bank_name,
-                    address=b.address,
-                    countryISO2=b.country_iso2,
-                    isHeadquarter=b.is_headquarter
-                ) for b in branches_result.scalars().all()
-            ]
-            return SwiftCodeWithBranches(
-                **base_data.model_dump(),
-                countryName=main_record.country_name,
-                branches=branches
-            )
+def _to_with_branches(record, branches) -> SwiftCodeWithBranches:
+    return SwiftCodeWithBranches(
+        **_to_basic(record).model_dump(),
+        countryName=record.country_name,
+        branches=[_to_basic(b) for b in branches]
+    )
+
+async def _resolve_swift_code(db: AsyncSession, swift_code: str):
+    try:
+        main_record, branches = await _find_swift_code(db, swift_code.upper())
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Database operation failed"
+        )
+
+    if not main_record:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"SWIFT code {swift_code} not found"
+        )
+    return main_record, branches
+
+async def _resolve_country_page(db: AsyncSession, country_code: str, limit: int = None, after: str = None):
+    """Returns (codes, cursor of the next page or None), whole country when limit is None"""
+    try:
+        # One extra row tells whether another page exists
+        codes = await _find_country_codes(
+            db, country_code.upper(), limit + 1 if limit else None, after.upper() if after else None
+        )
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Database operation failed"
+        )
+
+    if not codes:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No SWIFT codes found for country {country_code}"
+        )
+
+    if limit and len(codes) > limit:
+        return codes[:limit], codes[limit - 1].swift_code
+    return codes, None
+
+async def _shared(db: AsyncSession, build, *args):
+    """
+    Runs build(session, *args) once for all concurrent calls with the same arguments on
+    the same engine, a request pinned to the primary must not get a replica's result.
+    The shared call gets a session of its own on the caller's engine: it may outlive the
+    request that started it when that request is cancelled. Snapshot and directory
+    file lookups don't touch the database and are not worth coalescing.
+
+    The caller's read transaction, typically the country version lookup, is ended first
+    so its connection is back in the pool before the shared call takes one. A request
+    never holds two connections, and waiting callers can't drain a small pool.
+    """
+    if swift_code_cache.enabled or mapped_directory.reader() is not None or not lookups.enabled:
+        return await build(db, *args)
+    if db.new or db.dirty or db.deleted:
+        # Uncommitted writes are the caller's business, look up on its session
+        return await build(db, *args)
+    if db.in_transaction():
+        await db.commit()
+
+    async def run():
+        async with AsyncSession(bind=db.bind) as session:
+            return await build(session, *args)
+
+    return await lookups.do((db.bind, build.__name__) + args, run)
+
+async def _swift_code_model(db: AsyncSession, swift_code: str):
+    record, branches = await _resolve_swift_code(db, swift_code)
+    return _to_with_branches(record, branches), record.country_iso2
+
+async def _swift_code_json(db: AsyncSession, swift_code: str):
+    record, branches = await _resolve_swift_code(db, swift_code)
+    return encoding.encode_with_branches(record, branches), record.country_iso2
+
+async def get_swift_code_document(db: AsyncSession, swift_code: str, as_json: bool = False):
+    """
+    (document, country_iso2 of the code), the document as bytes with as_json.
+    The country is the stored one, whose version covers the code; it can differ
+    from positions 5-6 of the code.
+    """
+    return await _shared(db, _swift_code_json if as_json else _swift_code_model, swift_code.upper())
+
+async def get_swift_code(db: AsyncSession, swift_code: str):
+    return (await get_swift_code_document(db, swift_code))[0]
+
+async def get_swift_code_json(db: AsyncSession, swift_code: str) -> bytes:
+    """Same document as get_swift_code, encoded straight to bytes"""
+    return (await get_swift_code_document(db, swift_code, as_json=True))[0]
+
+async def get_swift_codes_batch(db: AsyncSession, swift_codes: list):
+    try:
+        # Keep the caller's order, drop duplicates
+        codes = list(dict.fromkeys(c.strip().upper() for c in swift_codes))
+        found = await _find_swift_codes(db, codes)
+
+        return SwiftCodeBatchGetResponse(
+            swiftCodes=[_to_with_branches(*found[c]) for c in codes if c in found],
+            missing=[c for c in codes if c not in found]
+        )
+
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Database operation failed"
+        )
+
+async def _country_page_model(db: AsyncSession, country_code: str, limit: int = None, after: str = None):
+    codes, next_after = await _resolve_country_page(db, country_code, limit, after)
+    return CountrySwiftCodesResponse(
+        countryISO2=country_code,
+        countryName=codes[0].country_name,
+        swiftCodes=[_to_basic(c) for c in codes]
+    ), next_after
+
+async def _country_page_json(db: AsyncSession, country_code: str, limit: int = None, after: str = None):
+    codes, next_after = await _resolve_country_page(db, country_code, limit, after)
+    return encoding.encode_country(country_code, codes[0].country_name, codes), next_after
+
+# ISO 9362: 4 institution characters, 2 letter country, 2 location characters, optional 3 character branch
+BIC_PATTERN = re.compile(r"^[A-Z0-9]{4}[A-Z]{2}[A-Z0-9]{2}([A-Z0-9]{3})?$")
+
+def _check_bic_structure(swift_code: str, country_iso2: str = None):
+    """(status, detail) of a malformed code, None when the structure is valid"""
+    if len(swift_code) not in (8, 11):
+        return "invalid_format", f"expected 8 or 11 characters, got {len(swift_code)}"
+    if not BIC_PATTERN.match(swift_code):
+        return "invalid_format", "expected institution (4), country (2 letters), location (2) and optional branch (3)"
+    if len(swift_code) == 11 and swift_code[8] == "X" and swift_code[8:] != "XXX":
+        return "invalid_format", "branch codes starting with X are reserved, except XXX"
+    if country_iso2 and country_iso2.upper() != swift_code[4:6]:
+        return "country_mismatch", f"positions 5-6 are {swift_code[4:6]}, expected {country_iso2.upper()}"
+    return None
+
+async def _active_codes(db: AsyncSession, swift_codes: list) -> set:
+    """The active codes among swift_codes, without loading branches"""
+    if swift_code_cache.enabled:
+        snapshot = await swift_code_cache.snapshot(db)
+        return {c for c in swift_codes if snapshot.get(c)}
+
+    directory = mapped_directory.reader()
+    if directory is not None:
+        return {c for c in swift_codes if directory.get(c)}
+
+    result = await db.execute(
+        select(SwiftCode.swift_code)
+        .where(backend.in_values(db, SwiftCode.swift_code, swift_codes, "codes"))
+        .where(SwiftCode.is_active == True)
+    )
+    return set(result.scalars())
+
+async def validate_swift_codes(db: AsyncSession, items: list):
+    """
+    Checks the ISO 9362 structure locally, then whether well-formed codes are active.
+    Codes the Bloom filter has never seen are answered without touching the database,
+    only possible hits are looked up.
+    """
+    checked = []
+    for item in items:
+        if isinstance(item, SwiftCodeValidateItem):
+            code, country = item.swiftCode.strip().upper(), item.countryISO2
         else:
-            return SwiftCodeWithBranches(
-                **base_data.model_dump(),
-                countryName=main_record.country_name
-            )
+            code, country = item.strip().upper(), None
+        checked.append((code, _check_bic_structure(code, country)))
 
+    candidates = list(dict.fromkeys(code for code, problem in checked if problem is None))
+    try:
+        lookup = candidates
+        if candidates and active_code_filter.enabled and not swift_code_cache.enabled and mapped_directory.reader() is None:
+            bloom = await active_code_filter.bloom(db)
+            lookup = [code for code in candidates if code in bloom]
+        active = await _active_codes(db, lookup) if lookup else set()
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Database operation failed"
         )
 
+    looked_up = set(lookup)
+    results = []
+    for code, problem in checked:
+        if problem is not None:
+            VALIDATED_CODES.inc(outcome=problem[0])
+            results.append(SwiftCodeValidateResult(swiftCode=code, valid=False, status=problem[0], detail=problem[1]))
+        elif code in active:
+            VALIDATED_CODES.inc(outcome="lookup_hit")
+            results.append(SwiftCodeValidateResult(swiftCode=code, valid=True, status="active"))
+        else:
+            VALIDATED_CODES.inc(outcome="lookup_miss" if code in looked_up else "bloom_negative")
+            results.append(SwiftCodeValidateResult(swiftCode=code, valid=False, status="not_found"))
+    return SwiftCodeValidateResponse(results=results)
+
 async def get_swift_codes_by_country(db: AsyncSession, country_code: str):
+    response, _ = await _shared(db, _country_page_model, country_code.upper(), None, None)
+    return response
+
+async def get_swift_codes_page(db: AsyncSession, country_code: str, limit: int, after: str = None):
+    """Keyset page of a country's codes, returns (response, cursor of the next page or None)"""
+    return await _shared(db, _country_page_model, country_code.upper(), limit, after.upper() if after else None)
+
+async def get_swift_codes_page_json(db: AsyncSession, country_code: str, limit: int = None, after: str = None):
+    """Same as get_swift_codes_page (or the whole country without limit), encoded straight to bytes"""
+    return await _shared(db, _country_page_json, country_code.upper(), limit, after.upper() if after else None)
+
+async def stream_swift_codes_by_country(db: AsyncSession, country_code: str, limit: int = None, after: str = None):
+    """
+    Yields one NDJSON line (a SwiftCodeBasic) per active code of the country.
+    FastAPI closes dependency sessions before a streamed body is sent, so rows are
+    read through a server-side cursor on a session of our own, bound to the same engine.
+    Only plain column rows are fetched, nothing accumulates in an identity map.
+    """
+    country_code = country_code.upper()
+    after = after.upper() if after else None
+
+    if swift_code_cache.enabled or mapped_directory.reader() is not None:
+        for record in await _find_country_codes(db, country_code, limit, after):
+            yield b"".join((encoding.basic_fragment(record), b"\n"))
+        return
+
+    query = (
+        select(
+            SwiftCode.swift_code,
+            SwiftCode.bank_name,
+            SwiftCode.address,
+            SwiftCode.country_iso2,
+            SwiftCode.is_headquarter
+        )
+        .where(SwiftCode.country_iso2 == country_code)
+        .where(SwiftCode.is_active == True)
+        .order_by(SwiftCode.swift_code)
+        .execution_options(yield_per=STREAM_CHUNK_SIZE)
+    )
+    if after:
+        query = query.where(SwiftCode.swift_code > after)
+    if limit:
+        query = query.limit(limit)
+
+    async with AsyncSession(bind=db.bind) as session:
+        result = await session.stream(query)
+        async for row in result:
+            yield encoding.encode_basic(row) + b"\n"
+
+async def stream_directory_export(db: AsyncSession, format: str):
+    """
+    Yields the whole active directory in `format` (csv or ndjson), one encoded chunk per
+    EXPORT_CHUNK_SIZE rows, ordered by country and code. Like the country stream it reads
+    through a server-side cursor on a session of its own; a single transaction keeps the
+    export consistent and memory is bounded by one chunk whatever the directory size.
+    """
+    encoder = export.ENCODERS[format]()
+    query = (
+        select(
+            SwiftCode.swift_code,
+            SwiftCode.bank_name,
+            SwiftCode.address,
+            SwiftCode.town_name,
+            SwiftCode.country_iso2,
+            SwiftCode.country_name,
+            SwiftCode.time_zone,
+            SwiftCode.is_headquarter
+        )
+        .where(SwiftCode.is_active == True)
+        .order_by(SwiftCode.country_iso2, SwiftCode.swift_code)
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+
+    async with AsyncSession(bind=db.bind) as session:
+        result = await session.stream(query)
+        empty = True
+        async for rows in result.partitions():
+            empty = False
+            yield encoder.encode(rows)
+        if empty:
+            # The CSV header still goes out for an empty directory
+            chunk = encoder.encode(())
+            if chunk:
+                yield chunk
+
+async def get_latest_change_seq(db: AsyncSession) -> int:
+    """Highest seq in the change log, 0 while it is empty"""
     try:
-        result = await db.execute(
-            select(SwiftCode)
-            .where(SwiftCode.country_iso2 == country_code.upper())
-            .where(SwiftCode.is_active == True)
-            .order_by(SwiftCode.swift_code)
+        result = await db.execute(select(func.coalesce(func.max(SwiftCodeChange.seq), 0)))
+        return result.scalar_one()
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Database operation failed"
         )
-        codes = result.scalars().all()
 
-        if not codes:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"No SWIFT codes found for country {country_code}"
-            )
+async def _search_table(db: AsyncSession, terms: list, country_code: str, limit: int):
+    # No pg_trgm outside PostgreSQL: the matching country's active rows are scored in process
+    query = select(SwiftCode).where(SwiftCode.is_active == True)
+    if country_code:
+        query = query.where(SwiftCode.country_iso2 == country_code)
+    result = await db.execute(query)
+    snapshot = DirectorySnapshot([DirectoryRecord.from_model(row) for row in result.scalars()], ())
+    return search.search_snapshot(snapshot, terms, country_code, limit)
 
-        return CountrySwiftCodesResponse(
-            countryISO2=country_code.upper(),
-            countryName=codes[0].country_name,
-            swiftCodes=[
-                SwiftCodeBasic(
-                    swiftCode=c.swift_code,
-                    bankName=c.bank_name,
-                    address=c.address,
-                    countryISO2=c.country_iso2,
-                    isHeadquarter=c.is_headquarter
-                ) for c in codes
-            ]
+async def search_swift_codes(db: AsyncSession, query: str, country_code: str = None, limit: int = 20):
+    """Codes matching every word of `query` by code prefix or bank/town name similarity, best first"""
+    terms = search.search_terms(query)
+    if not terms:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search query must contain letters or digits"
         )
+    country_code = country_code.upper() if country_code else None
 
+    try:
+        if swift_code_cache.enabled:
+            snapshot = await swift_code_cache.snapshot(db)
+            hits = search.search_snapshot(snapshot, terms, country_code, limit)
+        elif backend.is_postgres(db):
+            hits = await search.search_database(db, terms, country_code, limit)
+        else:
+            hits = await _search_table(db, terms, country_code, limit)
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Database operation failed"
         )
 
-async def create_swift_code(db: AsyncSession, data: SwiftCodeCreate):
+    return SwiftCodeSearchResponse(results=[
+        SwiftCodeSearchResult(
+            **_to_basic(record).model_dump(),
+            countryName=record.country_name,
+            townName=record.town_name,
+            score=round(score, 4)
+        )
+        for record, score in hits
+    ])
+
+async def _read_changes(db: AsyncSession, since: int, limit: int):
+    # Outer join for the current state, soft-deleted codes come back without one
+    result = await db.execute(
+        select(SwiftCodeChange, SwiftCode)
+        .outerjoin(SwiftCode, and_(SwiftCode.swift_code == SwiftCodeChange.swift_code, SwiftCode.is_active == True))
+        .where(SwiftCodeChange.seq > since)
+        .order_by(SwiftCodeChange.seq)
+        .limit(limit + 1)
+    )
+    return result.all()
+
+async def get_swift_code_changes(db: AsyncSession, since: int, limit: int, wait: float = 0) -> SwiftCodeChangesResponse:
+    """
+    Changes after the `since` cursor in seq order. Entries carry the code's state at the
+    time of the read, not of the change, so applying them in order mirrors the table.
+    With `wait` an empty poll blocks up to that many seconds for the next change.
+    """
     try:
-        existing = await db.execute(
-            select(SwiftCode.swift_code)
-            .where(SwiftCode.swift_code == data.swiftCode.upper())
+        changed = change_notifier.subscribe()
+        rows = await _read_changes(db, since, limit)
+        if not rows and wait:
+            # Ends the read transaction so the pooled connection is free while waiting
+            await db.commit()
+            try:
+                await asyncio.wait_for(changed.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                rows = await _read_changes(db, since, limit)
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Database operation failed"
         )
-        if existing.scalar_one_or_none():
+
+    changes = [
+        SwiftCodeChangeItem(
+            seq=change.seq,
+            swiftCode=change.swift_code,
+            countryISO2=change.country_iso2,
+            operation=change.operation,
+            changedAt=change.changed_at,
+            record=_to_basic(record) if record is not None else None
+        )
+        for change, record in rows[:limit]
+    ]
+    return SwiftCodeChangesResponse(
+        changes=changes,
+        nextSince=changes[-1].seq if changes else since,
+        hasMore=len(rows) > limit
+    )
+
+def _create_values(data: SwiftCodeCreate) -> dict:
+    swift_code = data.swiftCode.upper()
+    values = {
+        "id": uuid.uuid4(),
+        "swift_code": swift_code,
+        "bank_code": swift_code[:8],
+        "bank_name": data.bankName,
+        "address": data.address,
+        "country_iso2": data.countryISO2.upper(),
+        "country_name": data.countryName.upper(),
+        "is_headquarter": data.isHeadquarter,
+        "code_type": 'headquarter' if data.isHeadquarter else 'branch',
+        "is_active": True
+    }
+    values["content_hash"] = compute_content_hash(values)
+    return values
+
+# Columns rewritten when an existing code is upserted
+_UPSERT_COLUMNS = (
+    "bank_code",
+    "bank_name",
+    "address",
+    "country_iso2",
+    "country_name",
+    "is_headquarter",
+    "code_type",
+    "content_hash"
+)
+
+async def _upsert_swift_codes(db: AsyncSession, items: list, on_conflict: str = "skip") -> list:
+    """
+    Writes all items with one INSERT ... ON CONFLICT (swift_code) ... RETURNING and commits.
+    on_conflict="skip" leaves existing codes untouched, "update" overwrites and reactivates them.
+    Returns (swift_code, status) per item in input order.
+    """
+    # Within one statement a code may only be written once, the last occurrence wins
+    last_index = {item.swiftCode.upper(): i for i, item in enumerate(items)}
+    rows = [_create_values(item) for i, item in enumerate(items) if last_index[item.swiftCode.upper()] == i]
+
+    previous = await stored_countries(db, list(last_index)) if on_conflict == "update" else {}
+    stmt = backend.insert(db, SwiftCode).values(rows)
+    if on_conflict == "update":
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SwiftCode.swift_code],
+            set_={
+                **{c: stmt.excluded[c] for c in _UPSERT_COLUMNS},
+                "is_active": True,
+                "updated_at": func.now()
+            }
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[SwiftCode.swift_code])
+
+    result = await db.execute(stmt.returning(
+        SwiftCode.swift_code,
+        SwiftCode.bank_name,
+        SwiftCode.address,
+        SwiftCode.country_iso2,
+        SwiftCode.country_name,
+        SwiftCode.is_headquarter,
+        SwiftCode.town_name,
+        backend.inserted_flag(db, SwiftCode)
+    ))
+    written = {row.swift_code: row for row in result.all()}
+    versions = await bump_country_versions(db, [
+        *(row.country_iso2 for row in written.values()),
+        *(previous[code] for code in written if code in previous)
+    ])
+    await record_changes(db, [
+        (row.swift_code, row.country_iso2, "insert" if row.inserted else "update") for row in written.values()
+    ])
+    await db.commit()
+    change_notifier.notify()
+
+    for row in written.values():
+        swift_code_cache.upsert(DirectoryRecord.from_model(row))
+    swift_code_cache.set_country_versions(versions)
+    active_code_filter.add(written)
+    mapped_directory.schedule_rebuild(db.bind)
+
+    statuses = []
+    for i, item in enumerate(items):
+        code = item.swiftCode.upper()
+        if last_index[code] != i:
+            statuses.append((code, "duplicate"))
+        elif code not in written:
+            statuses.append((code, "exists"))
+        else:
+            statuses.append((code, "created" if written[code].inserted else "updated"))
+    return statuses
+
+async def create_swift_code(db: AsyncSession, data: SwiftCodeCreate):
+    try:
+        [(_, result)] = await _upsert_swift_codes(db, [data])
+        if result == "exists":
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"SWIFT code {data.swiftCode} already exists"
             )
 
-        new_code = SwiftCode(
-            swift_code=data.swiftCode.upper(),
-            bank_name=data.bankName,
-            address=data.address,
-            country_iso2=data.countryISO2.upper(),
-            country_name=data.countryName.upper(),
-            is_headquarter=data.isHeadquarter,
-            code_type='headquarter' if data.isHeadquarter else 'branch',
-            is_active=True
-        )
-
-        db.add(new_code)
-        await db.commit()
         return {"message": "SWIFT code created successfully"}
 
     except SQLAlchemyError as e:
@@ -132,6 +668,20 @@ async def create_swift_code(db: AsyncSession, data: SwiftCodeCreate):
             detail="Failed to create SWIFT code"
         )
 
+async def create_swift_codes_batch(db: AsyncSession, items: list, on_conflict: str = "skip"):
+    try:
+        statuses = await _upsert_swift_codes(db, items, on_conflict)
+        return SwiftCodeBatchCreateResponse(
+            results=[SwiftCodeBatchCreateItem(swiftCode=code, status=s) for code, s in statuses]
+        )
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create SWIFT codes"
+        )
+
 async def delete_swift_code(db: AsyncSession, swift_code: str):
     try:
         result = await db.execute(
@@ -147,7 +697,13 @@ async def delete_swift_code(db: AsyncSession, swift_code: str):
             )
 
         record.is_active = False
+        versions = await bump_country_versions(db, [record.country_iso2])
+        await record_changes(db, [(record.swift_code, record.country_iso2, "delete")])
         await db.commit()
+        change_notifier.notify()
+        swift_code_cache.remove(record.swift_code)
+        swift_code_cache.set_country_versions(versions)
+        mapped_directory.schedule_rebuild(db.bind)
         return {"message": "SWIFT code deleted successfully"}
 
     except SQLAlchemyError as e:
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_CALLS = registry.counter(
+    "singleflight_calls_total",
+    "Lookups by coalescing group, role=leader ran the query, role=shared reused an in-flight one",
+    ("group", "role")
+)
+SINGLEFLIGHT_IN_FLIGHT = registry.gauge(
+    "singleflight_in_flight", "Distinct lookups currently running, by coalescing group", ("group",)
+)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller starts `fn` as a task of its own and every caller, the first one
+    included, awaits it through asyncio.shield: a cancelled or timed out request only
+    stops waiting, the shared call keeps running for the others. Results and errors
+    are handed to everyone waiting at that moment and then forgotten, nothing is cached
+    and the next call after completion starts a fresh execution.
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await fn()
+
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            SINGLEFLIGHT_IN_FLIGHT.inc(group=self.name)
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role="leader")
+        else:
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role="shared")
+
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        SINGLEFLIGHT_IN_FLIGHT.dec(group=self.name)
+        # Mark the outcome as retrieved, every waiter may have been cancelled meanwhile
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Coalesced lookup {key} failed: {task.exception()!r}")
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -1,110 +1,479 @@
 import csv
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Tuple
 from fastapi import HTTPException
+from sqlalchemy import String, bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 
-from .models import SwiftCode
+from .backend import is_postgres
+from .models import SwiftCode, compute_content_hash
+from .cache import DirectoryRecord, swift_code_cache
+from .directory_file import mapped_directory
+from .bloom import active_code_filter
+from .versions import bump_country_versions
+from .changes import CHANGES_RECORDED, change_notifier, lock_change_log, notify_changes, record_changes
 
 logger = logging.getLogger(__name__)
 
-async def import_swift_codes_from_csv(db: AsyncSession, filepath: str = "/app/Interns_2025_SWIFT_CODES.csv") -> Dict[str, int]:
-   
+DEFAULT_CSV_PATH = "/app/Interns_2025_SWIFT_CODES.csv"
+
+REQUIRED_COLUMNS = {
+    'COUNTRY ISO2 CODE',
+    'SWIFT CODE',
+    'CODE TYPE',
+    'NAME',
+    'ADDRESS',
+    'TOWN NAME',
+    'COUNTRY NAME',
+    'TIME ZONE'
+}
+
+# Column order of the COPY staging table, row_num keeps the last duplicate of a code
+STAGING_COLUMNS = (
+    'row_num',
+    'swift_code',
+    'bank_code',
+    'country_iso2',
+    'code_type',
+    'bank_name',
+    'address',
+    'town_name',
+    'country_name',
+    'time_zone',
+    'is_headquarter',
+    'content_hash'
+)
+
+COPY_BATCH_SIZE = 5000
+
+def _csv_reader(csvfile) -> csv.DictReader:
+    """DictReader over the non-empty lines of an open CSV file, header checked"""
+    reader = csv.DictReader(line for line in csvfile if line.strip())
+    if not reader.fieldnames:
+        raise HTTPException(status_code=400, detail="CSV file is empty")
+
+    missing_columns = REQUIRED_COLUMNS - set(reader.fieldnames)
+    if missing_columns:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Missing required columns: {missing_columns}"
+        )
+    return reader
+
+def _normalize_row(row: Dict[str, str]) -> Dict[str, Any]:
+    """Maps a CSV row onto SwiftCode columns, raises ValueError for rows the table would reject"""
+    swift_code = row['SWIFT CODE'].strip().upper()
+    if len(swift_code) not in (8, 11):
+        raise ValueError(f"invalid SWIFT code '{swift_code}'")
+
+    is_headquarter = row['CODE TYPE'].strip().upper() == 'HEADQUARTER'
+    record = {
+        'swift_code': swift_code,
+        'bank_code': swift_code[:8],
+        'country_iso2': row['COUNTRY ISO2 CODE'].strip().upper(),
+        'code_type': 'headquarter' if is_headquarter else 'branch',
+        'bank_name': row['NAME'].strip(),
+        'address': f"{row['ADDRESS']}, {row['TOWN NAME']}",
+        'town_name': row['TOWN NAME'].strip(),
+        'country_name': row['COUNTRY NAME'].strip(),
+        'time_zone': row['TIME ZONE'].strip() if row['TIME ZONE'] else None,
+        'is_headquarter': is_headquarter
+    }
+    record['content_hash'] = compute_content_hash(record)
+
+    if len(record['country_iso2']) != 2:
+        raise ValueError(f"invalid country code '{record['country_iso2']}'")
+    for name, value in record.items():
+        column = SwiftCode.__table__.c[name]
+        if value is None:
+            if not column.nullable:
+                raise ValueError(f"missing {name}")
+        elif isinstance(value, str) and len(value) > column.type.length:
+            raise ValueError(f"{name} longer than {column.type.length} characters")
+    return record
+
+def _staged_batches(reader: csv.DictReader, stats: Dict[str, Any]) -> Iterator[List[Tuple]]:
+    """
+    Normalizes rows lazily and yields COPY-ready tuples in batches. Rejects are logged and
+    counted, the codes they name (when there is one) are collected in stats['rejected_codes'].
+    """
+    batch = []
+    for row_num, row in enumerate(reader, start=1):
+        stats['total'] = row_num
+        try:
+            record = _normalize_row(row)
+        except Exception as e:
+            stats['rejected'] += 1
+            code = (row.get('SWIFT CODE') or '').strip().upper()
+            if code:
+                stats['rejected_codes'].add(code)
+            logger.error(f"Error in row {row_num}: {str(e)}")
+            continue
+
+        batch.append((row_num,) + tuple(record[c] for c in STAGING_COLUMNS[1:]))
+        if len(batch) >= COPY_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _import_summary(imported: int, total: int, rejected: int, duplicates: int = 0, **counts: int) -> Dict[str, Any]:
+    """
+    rejected: rows that failed validation, duplicates: valid rows superseded by a later
+    row of the same code; skipped is both together
+    """
+    success_rate = (imported / total) * 100 if total else 0.0
+    logger.info(
+        f"Import completed - Success: {imported}, Rejected: {rejected}, Duplicates: {duplicates}, "
+        f"Total: {total}, Success rate: {success_rate:.2f}%"
+    )
+    return {
+        "imported": imported,
+        **counts,
+        "total": total,
+        "rejected": rejected,
+        "duplicates": duplicates,
+        "skipped": rejected + duplicates,
+        "success_rate": f"{success_rate:.2f}%"
+    }
+
+async def import_swift_codes_from_csv(db: AsyncSession, filepath: str = DEFAULT_CSV_PATH) -> Dict[str, int]:
+
     logger.info(f"Starting CSV import from {filepath}")
 
     try:
         with open(filepath, mode='r', encoding='utf-8-sig') as csvfile:
-            lines = [line for line in csvfile if line.strip()]
-            if not lines:
-                raise HTTPException(status_code=400, detail="CSV file is empty")
-                
-            reader = csv.DictReader(lines)
-                  
-            required_columns = {
-                'COUNTRY ISO2 CODE',
-                'SWIFT CODE', 
-                'CODE TYPE',
-                'NAME',
-                'ADDRESS',
-                'TOWN NAME',
-                'COUNTRY NAME',
-                'TIME ZONE'
-            }
-            missing_columns = required_columns - set(reader.fieldnames)
-            if missing_columns:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Missing required columns: {missing_columns}"
-                )
+            reader = _csv_reader(csvfile)
 
             imported = 0
+            row_num = 0
+            countries = set()
+            written = []
             batch = []
             batch_size = 100  # Optimal batch size for performance
-            
-            async with db.begin(): 
+
+            async with db.begin():
                 for row_num, row in enumerate(reader, start=1):
                     try:
                         # Create record from CSV row
-                        record = SwiftCode(
-                            country_iso2=row['COUNTRY ISO2 CODE'].strip().upper(),
-                            swift_code=row['SWIFT CODE'].strip().upper(),
-                                code_type='headquarter' if row['CODE TYPE'].strip().upper() == 'HEADQUARTER' else 'branch',
-                            bank_name=row['NAME'].strip(),
-                            address=f"{row['ADDRESS']}, {row['TOWN NAME']}",
-                            town_name=row['TOWN NAME'].strip(),
-                            country_name=row['COUNTRY NAME'].strip(),
-                            time_zone=row['TIME ZONE'].strip() if row['TIME ZONE'] else None,
-                            is_headquarter=row['CODE TYPE'].strip().upper() == 'HEADQUARTER',
-                            is_active=True
-                        )
+                        record = SwiftCode(**_normalize_row(row), is_active=True)
                         batch.append(record)
-                        
-                        
+                        countries.add(record.country_iso2)
+
+
                         if len(batch) >= batch_size:
                             db.add_all(batch)
-                            await db.flush() 
+                            await db.flush()
+                            written.extend((r.swift_code, r.country_iso2, "insert") for r in batch)
                             imported += len(batch)
                             logger.debug(f"Processed {imported} records")
                             batch = []
-                            
+
                     except Exception as e:
                         logger.error(f"Error in row {row_num}: {str(e)}")
                         continue
-                
-        
+
+
                 if batch:
                     db.add_all(batch)
                     await db.flush()
+                    written.extend((r.swift_code, r.country_iso2, "insert") for r in batch)
                     imported += len(batch)
-                
-                
-            logger.info(
-                f"Import completed - Success: {imported}, Failed: {row_num - imported}, "
-                f"Total: {row_num}, Success rate: {(imported/row_num)*100:.2f}%"
-            )
-            
-            return {
-                "imported": imported,
-                "total": row_num,
-                "skipped": row_num - imported,
-                "success_rate": f"{(imported/row_num)*100:.2f}%"
-            }
-            
+
+                await bump_country_versions(db, countries)
+                await record_changes(db, written)
+
+            change_notifier.notify()
+            swift_code_cache.invalidate()
+            active_code_filter.invalidate()
+            mapped_directory.schedule_rebuild(db.bind)
+            return _import_summary(imported, row_num, rejected=row_num - imported)
+
     except FileNotFoundError:
         error_msg = f"CSV file not found at {filepath}"
         logger.error(error_msg)
         raise HTTPException(status_code=404, detail=error_msg)
-        
+
     except HTTPException:
-        raise 
-        
+        raise
+
     except SQLAlchemyError as e:
         error_msg = f"Database error during import: {str(e)}"
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
-        
+
     except Exception as e:
         error_msg = f"Unexpected error during import: {str(e)}"
         logger.error(error_msg)
-        raise HTTPException(status_code=500, detail=error_msg)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=error_msg)
+
+async def _create_staging_table(db: AsyncSession):
+    # Executed through the session first so the driver transaction is open before COPY,
+    # ON COMMIT DROP then cleans the table up together with the import transaction
+    await db.execute(text("""
+        CREATE TEMP TABLE swift_codes_staging (
+            row_num integer NOT NULL,
+            swift_code varchar(11) NOT NULL,
+            bank_code varchar(8) NOT NULL,
+            country_iso2 varchar(2) NOT NULL,
+            code_type varchar(20) NOT NULL,
+            bank_name varchar(255) NOT NULL,
+            address varchar(512) NOT NULL,
+            town_name varchar(100),
+            country_name varchar(100) NOT NULL,
+            time_zone varchar(50),
+            is_headquarter boolean NOT NULL,
+            content_hash varchar(32) NOT NULL
+        ) ON COMMIT DROP
+    """))
+
+async def _copy_csv_to_staging(db: AsyncSession, csvfile, stats: Dict[str, Any]):
+    """Streams the CSV into swift_codes_staging with COPY, one batch in memory at a time"""
+    if not is_postgres(db):
+        raise HTTPException(
+            status_code=501,
+            detail="Bulk load and sync need PostgreSQL, use import_swift_codes_from_csv or POST /v1/imports"
+        )
+    reader = _csv_reader(csvfile)
+    await _create_staging_table(db)
+
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+
+    for batch in _staged_batches(reader, stats):
+        await driver_connection.copy_records_to_table(
+            'swift_codes_staging',
+            records=batch,
+            columns=STAGING_COLUMNS
+        )
+        logger.debug(f"Staged {stats['total']} rows")
+
+async def bulk_load_swift_codes_from_csv(db: AsyncSession, filepath: str = DEFAULT_CSV_PATH) -> Dict[str, Any]:
+    """
+    Fast path for large directory files: rows are streamed from the CSV, COPY-ed into a
+    temporary staging table and merged into swift_codes with a single INSERT ... ON CONFLICT.
+    Existing codes are overwritten and reactivated. Requires PostgreSQL with asyncpg.
+    """
+    logger.info(f"Starting bulk CSV load from {filepath}")
+    stats = {'total': 0, 'rejected': 0, 'rejected_codes': set()}
+
+    try:
+        with open(filepath, mode='r', encoding='utf-8-sig') as csvfile:
+            await _copy_csv_to_staging(db, csvfile, stats)
+
+        # New countries of the staged codes and the ones they are stored under before the upsert
+        countries = await db.execute(text("""
+            SELECT country_iso2 FROM swift_codes_staging
+            UNION
+            SELECT t.country_iso2 FROM swift_codes t JOIN swift_codes_staging s ON s.swift_code = t.swift_code
+        """))
+        countries = countries.scalars().all()
+
+        # The change log rows are written by the same statement, only per-operation counts come back
+        await lock_change_log(db)
+        result = await db.execute(text("""
+            WITH written AS (
+                INSERT INTO swift_codes (
+                    id, swift_code, bank_code, country_iso2, code_type, bank_name,
+                    address, town_name, country_name, time_zone, is_headquarter, content_hash, is_active
+                )
+                SELECT DISTINCT ON (swift_code)
+                    gen_random_uuid(), swift_code, bank_code, country_iso2, code_type, bank_name,
+                    address, town_name, country_name, time_zone, is_headquarter, content_hash, true
+                FROM swift_codes_staging
+                ORDER BY swift_code, row_num DESC
+                ON CONFLICT (swift_code) DO UPDATE SET
+                    bank_code = EXCLUDED.bank_code,
+                    country_iso2 = EXCLUDED.country_iso2,
+                    code_type = EXCLUDED.code_type,
+                    bank_name = EXCLUDED.bank_name,
+                    address = EXCLUDED.address,
+                    town_name = EXCLUDED.town_name,
+                    country_name = EXCLUDED.country_name,
+                    time_zone = EXCLUDED.time_zone,
+                    is_headquarter = EXCLUDED.is_headquarter,
+                    content_hash = EXCLUDED.content_hash,
+                    is_active = true,
+                    updated_at = now()
+                RETURNING swift_code, country_iso2, xmax = 0 AS inserted
+            ), logged AS (
+                INSERT INTO swift_code_changes (swift_code, country_iso2, operation)
+                SELECT swift_code, country_iso2, CASE WHEN inserted THEN 'insert' ELSE 'update' END
+                FROM written
+                ORDER BY swift_code
+                RETURNING operation
+            )
+            SELECT operation, count(*) AS changed FROM logged GROUP BY operation
+        """))
+        logged = {row.operation: row.changed for row in result}
+        imported = sum(logged.values())
+        await notify_changes(db)
+        await bump_country_versions(db, countries)
+        await db.commit()
+        change_notifier.notify()
+        for operation, count in logged.items():
+            CHANGES_RECORDED.inc(count, operation=operation)
+
+        swift_code_cache.invalidate()
+        active_code_filter.invalidate()
+        mapped_directory.schedule_rebuild(db.bind)
+        # Every distinct valid code is written, the remaining valid rows were duplicates
+        return _import_summary(
+            imported,
+            stats['total'],
+            rejected=stats['rejected'],
+            duplicates=stats['total'] - stats['rejected'] - imported,
+            inserted=logged.get('insert', 0),
+            updated=logged.get('update', 0)
+        )
+
+    except FileNotFoundError:
+        error_msg = f"CSV file not found at {filepath}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=404, detail=error_msg)
+
+    except HTTPException:
+        await db.rollback()
+        raise
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        error_msg = f"Database error during import: {str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+
+async def sync_swift_codes_from_csv(
+    db: AsyncSession,
+    filepath: str = DEFAULT_CSV_PATH,
+    soft_delete_missing: bool = True
+) -> Dict[str, Any]:
+    """
+    Delta sync of swift_codes against a full directory file.
+    The file is staged like in bulk_load_swift_codes_from_csv, then per-row content
+    hashes decide what to touch: new codes are inserted, changed (or reactivated) codes
+    are updated, codes absent from the file are soft-deleted. Unchanged rows are not
+    rewritten. Codes named by rows that failed validation are kept as they are, a broken
+    row is not the same as a code dropped from the directory. Returns a diff summary.
+    """
+    logger.info(f"Starting CSV delta sync from {filepath}")
+    stats = {'total': 0, 'rejected': 0, 'rejected_codes': set()}
+
+    try:
+        with open(filepath, mode='r', encoding='utf-8-sig') as csvfile:
+            await _copy_csv_to_staging(db, csvfile, stats)
+
+        # Keep the last occurrence of every code and index staging for the joins below
+        await db.execute(text("CREATE INDEX ON swift_codes_staging (swift_code, row_num)"))
+        await db.execute(text("""
+            DELETE FROM swift_codes_staging a
+            USING swift_codes_staging b
+            WHERE a.swift_code = b.swift_code AND a.row_num < b.row_num
+        """))
+        await db.execute(text("ANALYZE swift_codes_staging"))
+
+        staged = (await db.execute(text("SELECT count(*) FROM swift_codes_staging"))).scalar_one()
+        if not staged:
+            raise HTTPException(status_code=400, detail="CSV file contains no valid rows, refusing to sync")
+
+        # Countries that codes are about to leave, their versions move too
+        moved_from = (await db.execute(text("""
+            SELECT DISTINCT t.country_iso2
+            FROM swift_codes t JOIN swift_codes_staging s ON s.swift_code = t.swift_code
+            WHERE t.country_iso2 IS DISTINCT FROM s.country_iso2
+        """))).scalars().all()
+
+        updated = (await db.execute(text("""
+            UPDATE swift_codes t SET
+                bank_code = s.bank_code,
+                country_iso2 = s.country_iso2,
+                code_type = s.code_type,
+                bank_name = s.bank_name,
+                address = s.address,
+                town_name = s.town_name,
+                country_name = s.country_name,
+                time_zone = s.time_zone,
+                is_headquarter = s.is_headquarter,
+                content_hash = s.content_hash,
+                is_active = true,
+                updated_at = now()
+            FROM swift_codes_staging s
+            WHERE t.swift_code = s.swift_code
+              AND (t.content_hash IS DISTINCT FROM s.content_hash OR NOT t.is_active)
+            RETURNING t.swift_code, t.bank_name, t.address, t.country_iso2, t.country_name, t.is_headquarter, t.town_name
+        """))).all()
+
+        inserted = (await db.execute(text("""
+            INSERT INTO swift_codes (
+                id, swift_code, bank_code, country_iso2, code_type, bank_name,
+                address, town_name, country_name, time_zone, is_headquarter, content_hash, is_active
+            )
+            SELECT
+                gen_random_uuid(), s.swift_code, s.bank_code, s.country_iso2, s.code_type, s.bank_name,
+                s.address, s.town_name, s.country_name, s.time_zone, s.is_headquarter, s.content_hash, true
+            FROM swift_codes_staging s
+            WHERE NOT EXISTS (SELECT 1 FROM swift_codes t WHERE t.swift_code = s.swift_code)
+            ON CONFLICT (swift_code) DO NOTHING
+            RETURNING swift_code, bank_name, address, country_iso2, country_name, is_headquarter, town_name
+        """))).all()
+
+        deleted = []
+        if soft_delete_missing:
+            deleted = (await db.execute(
+                text("""
+                    UPDATE swift_codes t SET is_active = false, updated_at = now()
+                    WHERE t.is_active
+                      AND NOT EXISTS (SELECT 1 FROM swift_codes_staging s WHERE s.swift_code = t.swift_code)
+                      AND NOT t.swift_code = ANY(:rejected_codes)
+                    RETURNING t.swift_code, t.country_iso2
+                """).bindparams(bindparam("rejected_codes", type_=ARRAY(String))),
+                {"rejected_codes": sorted(stats['rejected_codes'])}
+            )).all()
+
+        versions = await bump_country_versions(
+            db, [row.country_iso2 for row in updated + inserted + deleted] + list(moved_from)
+        )
+        await record_changes(db, [
+            *((row.swift_code, row.country_iso2, "insert") for row in inserted),
+            *((row.swift_code, row.country_iso2, "update") for row in updated),
+            *((row.swift_code, row.country_iso2, "delete") for row in deleted)
+        ])
+        await db.commit()
+        change_notifier.notify()
+
+        for row in updated + inserted:
+            swift_code_cache.upsert(DirectoryRecord.from_model(row))
+        for row in deleted:
+            swift_code_cache.remove(row.swift_code)
+        swift_code_cache.set_country_versions(versions)
+        active_code_filter.add(row.swift_code for row in updated + inserted)
+        mapped_directory.schedule_rebuild(db.bind)
+
+        summary = {
+            "inserted": len(inserted),
+            "updated": len(updated),
+            "deleted": len(deleted),
+            "unchanged": staged - len(inserted) - len(updated),
+            "total": stats['total'],
+            "rejected": stats['rejected']
+        }
+        logger.info(f"Sync completed - {summary}")
+        return summary
+
+    except FileNotFoundError:
+        error_msg = f"CSV file not found at {filepath}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=404, detail=error_msg)
+
+    except HTTPException:
+        await db.rollback()
+        raise
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        error_msg = f"Database error during sync: {str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
@@ -0,0 +1,86 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from fastapi import Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import backend
+from .models import CountryVersion, SwiftCode
+from .cache import swift_code_cache
+from .directory_file import mapped_directory
+
+# (version, updated_at in UTC) of a country, (0, None) until its first tracked write
+VersionInfo = Tuple[int, Optional[datetime]]
+
+async def bump_country_versions(db: AsyncSession, countries: Iterable[str]) -> Dict[str, VersionInfo]:
+    """
+    Increments the version of every given country inside the caller's transaction.
+    Call swift_code_cache.set_country_versions() with the result after commit.
+    """
+    countries = sorted({c.upper() for c in countries if c})
+    if not countries:
+        return {}
+
+    now = datetime.utcnow().replace(microsecond=0)
+    stmt = backend.insert(db, CountryVersion).values(
+        [{"country_iso2": c, "version": 1, "updated_at": now} for c in countries]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CountryVersion.country_iso2],
+        set_={"version": CountryVersion.version + 1, "updated_at": stmt.excluded.updated_at}
+    ).returning(CountryVersion.country_iso2, CountryVersion.version, CountryVersion.updated_at)
+
+    result = await db.execute(stmt)
+    return {row.country_iso2: (row.version, row.updated_at) for row in result}
+
+async def stored_countries(db: AsyncSession, swift_codes: Sequence[str]) -> Dict[str, str]:
+    """
+    Country each of the given codes is stored under, read before a write that may move
+    codes to another country. Both the old and the new country need a version bump.
+    """
+    if not swift_codes:
+        return {}
+    result = await db.execute(
+        select(SwiftCode.swift_code, SwiftCode.country_iso2)
+        .where(backend.in_values(db, SwiftCode.swift_code, swift_codes, "swift_codes"))
+    )
+    return {row.swift_code: row.country_iso2 for row in result}
+
+async def get_country_version(db: AsyncSession, country_code: str) -> VersionInfo:
+    # With the snapshot or the directory file enabled the version must come from the same
+    # place as the body, otherwise stale content could be served under a fresh ETag
+    if swift_code_cache.enabled:
+        snapshot = await swift_code_cache.snapshot(db)
+        return snapshot.country_versions.get(country_code, (0, None))
+    directory = mapped_directory.reader()
+    if directory is not None:
+        return directory.country_version(country_code)
+
+    result = await db.execute(
+        select(CountryVersion.version, CountryVersion.updated_at)
+        .where(CountryVersion.country_iso2 == country_code)
+    )
+    row = result.first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+def make_etag(key: str, version: int, variant: Optional[str] = None) -> str:
+    """Strong ETag for `key` at `version`, `variant` distinguishes representations of the same data"""
+    if variant:
+        return f'"{key}-{version}-{hashlib.md5(variant.encode("utf-8")).hexdigest()[:8]}"'
+    return f'"{key}-{version}"'
+
+def validator_headers(etag: str, updated_at: Optional[datetime]) -> Dict[str, str]:
+    headers = {"ETag": etag, "Vary": "Accept"}
+    if updated_at is not None:
+        headers["Last-Modified"] = format_datetime(updated_at.replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
@@ -0,0 +1,9 @@
+"""
+Load tests and micro-benchmarks for the SWIFT Codes API.
+
+    python -m benchmarks seed --size 100000
+    python -m benchmarks load --size 100000 --mode inprocess --concurrency 1,16,64 --output results.json
+    python -m benchmarks micro --output micro.json
+    python -m benchmarks import --size 100000 --output import.json
+    python -m benchmarks compare results.json --baseline baseline.json
+"""
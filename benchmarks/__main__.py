@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from typing import List
+
+from . import __doc__ as usage, results
+from .data import sample_codes, write_csv
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+def _str_list(value: str) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+async def _seed(size: int, seed: int):
+    # Imported late so --database-url is in the environment before the engine is created
+    from app.backend import is_postgres
+    from app.database import AsyncSessionLocal, dispose_engines, engine
+    from app.migrations import init_db
+    from app.utils import import_swift_codes_from_csv, sync_swift_codes_from_csv
+
+    await init_db()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "synthetic.csv")
+        rows = write_csv(path, size, seed)
+        print(f"Generated {rows} synthetic codes")
+        async with AsyncSessionLocal() as session:
+            if is_postgres(engine):
+                # A sync leaves exactly the synthetic directory active, whatever was loaded before
+                summary = await sync_swift_codes_from_csv(session, path)
+            else:
+                # No COPY outside PostgreSQL, seed a fresh SQLite file with plain inserts
+                summary = await import_swift_codes_from_csv(session, path)
+    await dispose_engines()
+    print(f"Seeded: {summary}")
+
+def _finish(args, output: dict, parameters: dict) -> int:
+    if args.output:
+        results.save(args.output, output, parameters)
+    if args.baseline:
+        regressions = results.compare({"results": output}, results.load(args.baseline), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:", *regressions, sep="\n  ")
+            return 1
+    return 0
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=usage, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--database-url", help="Overrides DATABASE_URL for the app under test")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_result_options(command):
+        command.add_argument("--output", help="Write results as JSON to this file")
+        command.add_argument("--baseline", help="Compare against a results file, exit 1 on regressions")
+        command.add_argument("--tolerance", type=float, default=0.10, help="Allowed slowdown as a fraction (default 0.10)")
+
+    seed = commands.add_parser("seed", help="Load a synthetic directory into the database")
+    seed.add_argument("--size", type=int, default=100000)
+    seed.add_argument("--seed", type=int, default=0)
+
+    load = commands.add_parser("load", help="Latency and throughput per endpoint")
+    load.add_argument("--size", type=int, default=100000, help="Size used for `seed`, to pick existing codes")
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    load.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    load.add_argument("--concurrency", type=_int_list, default=[1, 16, 64])
+    load.add_argument("--scenarios", type=_str_list, default=None, help="Comma separated, default all")
+    load.add_argument("--requests", type=int, default=2000, help="Measured requests per scenario and level")
+    load.add_argument("--warmup", type=int, default=200)
+    add_result_options(load)
+
+    micro = commands.add_parser("micro", help="CSV parsing, serialization and snapshot micro-benchmarks")
+    micro.add_argument("--rows", type=int, default=10000)
+    micro.add_argument("--country-size", type=int, default=1000)
+    micro.add_argument("--repeat", type=int, default=5)
+    add_result_options(micro)
+
+    imports = commands.add_parser("import", help="CSV import and import-job batches against the seeded database")
+    imports.add_argument("--size", type=int, default=100000, help="Size used for `seed`, new codes continue after it")
+    imports.add_argument("--seed", type=int, default=0)
+    imports.add_argument("--rows", type=int, default=10000, help="New codes written per run, rolled back afterwards")
+    imports.add_argument("--repeat", type=int, default=5)
+    add_result_options(imports)
+
+    compare = commands.add_parser("compare", help="Compare two results files")
+    compare.add_argument("current")
+    compare.add_argument("--baseline", required=True)
+    compare.add_argument("--tolerance", type=float, default=0.10)
+
+    args = parser.parse_args(argv)
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    if args.command == "seed":
+        asyncio.run(_seed(args.size, args.seed))
+        return 0
+
+    if args.command == "load":
+        from .load import SCENARIOS, run_load
+
+        scenarios = args.scenarios or list(SCENARIOS)
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            parser.error(f"unknown scenarios {sorted(unknown)}, choose from {sorted(SCENARIOS)}")
+        codes = sample_codes(args.size, args.seed)
+        output = asyncio.run(run_load(
+            codes, args.mode, args.concurrency, scenarios, args.requests, args.warmup, args.workers
+        ))
+        return _finish(args, output, {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "database_url")})
+
+    if args.command == "micro":
+        from .micro import run_micro
+
+        output = run_micro(args.rows, args.country_size, args.repeat)
+        return _finish(args, output, {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "database_url")})
+
+    if args.command == "import":
+        from .imports import run_import
+
+        output = asyncio.run(run_import(args.size, args.seed, args.rows, args.repeat))
+        return _finish(args, output, {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "database_url")})
+
+    regressions = results.compare(results.load(args.current), results.load(args.baseline), args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:", *regressions, sep="\n  ")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
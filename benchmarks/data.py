@@ -0,0 +1,114 @@
+import csv
+import random
+import string
+from typing import Dict, Iterator, List, Tuple
+
+# (ISO2, name, time zone) of the countries the synthetic banks are spread over
+COUNTRIES: List[Tuple[str, str, str]] = [
+    ("AL", "ALBANIA", "Europe/Tirane"),
+    ("AT", "AUSTRIA", "Europe/Vienna"),
+    ("BE", "BELGIUM", "Europe/Brussels"),
+    ("BG", "BULGARIA", "Europe/Sofia"),
+    ("BR", "BRAZIL", "America/Sao_Paulo"),
+    ("CA", "CANADA", "America/Toronto"),
+    ("CH", "SWITZERLAND", "Europe/Zurich"),
+    ("CL", "CHILE", "America/Santiago"),
+    ("CN", "CHINA", "Asia/Shanghai"),
+    ("CZ", "CZECHIA", "Europe/Prague"),
+    ("DE", "GERMANY", "Europe/Berlin"),
+    ("DK", "DENMARK", "Europe/Copenhagen"),
+    ("ES", "SPAIN", "Europe/Madrid"),
+    ("FI", "FINLAND", "Europe/Helsinki"),
+    ("FR", "FRANCE", "Europe/Paris"),
+    ("GB", "UNITED KINGDOM", "Europe/London"),
+    ("GR", "GREECE", "Europe/Athens"),
+    ("HU", "HUNGARY", "Europe/Budapest"),
+    ("IE", "IRELAND", "Europe/Dublin"),
+    ("IN", "INDIA", "Asia/Kolkata"),
+    ("IT", "ITALY", "Europe/Rome"),
+    ("JP", "JAPAN", "Asia/Tokyo"),
+    ("LT", "LITHUANIA", "Europe/Vilnius"),
+    ("LV", "LATVIA", "Europe/Riga"),
+    ("MC", "MONACO", "Europe/Monaco"),
+    ("MT", "MALTA", "Europe/Malta"),
+    ("MX", "MEXICO", "America/Mexico_City"),
+    ("NL", "NETHERLANDS", "Europe/Amsterdam"),
+    ("NO", "NORWAY", "Europe/Oslo"),
+    ("PL", "POLAND", "Europe/Warsaw"),
+    ("PT", "PORTUGAL", "Europe/Lisbon"),
+    ("RO", "ROMANIA", "Europe/Bucharest"),
+    ("SE", "SWEDEN", "Europe/Stockholm"),
+    ("SK", "SLOVAKIA", "Europe/Bratislava"),
+    ("TR", "TURKEY", "Europe/Istanbul"),
+    ("UA", "UKRAINE", "Europe/Kiev"),
+    ("US", "UNITED STATES", "America/New_York"),
+    ("UY", "URUGUAY", "America/Montevideo"),
+]
+
+TOWNS = ["CAPITAL", "PORT", "NORTH", "SOUTH", "EAST", "WEST", "CENTRAL", "OLD TOWN"]
+WORDS = ["FIRST", "UNITED", "NATIONAL", "COMMERCIAL", "SAVINGS", "TRUST", "INVESTMENT", "COOPERATIVE"]
+
+CSV_HEADER = [
+    "COUNTRY ISO2 CODE", "SWIFT CODE", "CODE TYPE", "NAME", "ADDRESS", "TOWN NAME", "COUNTRY NAME", "TIME ZONE"
+]
+
+def _bank_letters(index: int) -> str:
+    # 4 letters, unique for the first 26**4 banks
+    letters = []
+    for _ in range(4):
+        index, digit = divmod(index, 26)
+        letters.append(string.ascii_uppercase[digit])
+    return "".join(reversed(letters))
+
+def generate_directory(size: int, seed: int = 0, max_branches: int = 8) -> Iterator[Dict[str, str]]:
+    """
+    Yields `size` CSV rows in the importer's format. Banks get a headquarter (XXX) and
+    0..max_branches branches sharing its 8-character bank code. The same size and seed
+    always produce the same directory.
+    """
+    rng = random.Random(seed)
+    produced = 0
+    bank = 0
+    while produced < size:
+        iso2, country_name, time_zone = COUNTRIES[rng.randrange(len(COUNTRIES))]
+        location = rng.choice(string.ascii_uppercase + string.digits) + rng.choice(string.ascii_uppercase + string.digits)
+        bank_code = _bank_letters(bank) + iso2 + location
+        bank_name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} BANK {bank}"
+        bank += 1
+
+        for branch in range(min(1 + rng.randint(0, max_branches), size - produced)):
+            town = rng.choice(TOWNS)
+            yield {
+                "COUNTRY ISO2 CODE": iso2,
+                "SWIFT CODE": bank_code + ("XXX" if branch == 0 else f"{branch:03d}"),
+                "CODE TYPE": "HEADQUARTER" if branch == 0 else "BRANCH",
+                "NAME": bank_name,
+                "ADDRESS": f"{rng.randint(1, 999)} {rng.choice(WORDS)} STREET",
+                "TOWN NAME": town,
+                "COUNTRY NAME": country_name,
+                "TIME ZONE": time_zone,
+            }
+            produced += 1
+
+def write_csv(path: str, size: int, seed: int = 0) -> int:
+    """Writes the synthetic directory to `path`, returns the number of rows"""
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=CSV_HEADER)
+        writer.writeheader()
+        for row in generate_directory(size, seed):
+            writer.writerow(row)
+            rows += 1
+    return rows
+
+def sample_codes(size: int, seed: int = 0) -> Dict[str, List[str]]:
+    """Codes of the synthetic directory grouped for the load scenarios"""
+    headquarters, branches, countries = [], [], set()
+    for row in generate_directory(size, seed):
+        (headquarters if row["CODE TYPE"] == "HEADQUARTER" else branches).append(row["SWIFT CODE"])
+        countries.add(row["COUNTRY ISO2 CODE"])
+    return {
+        "headquarters": headquarters,
+        "branches": branches or headquarters,
+        "countries": sorted(countries),
+    }
@@ -0,0 +1,113 @@
+import asyncio
+import csv
+import os
+import statistics
+import tempfile
+import time
+from itertools import islice
+from typing import Awaitable, Callable, Dict
+
+from .data import CSV_HEADER, generate_directory
+
+def _new_rows_csv(path: str, size: int, seed: int, rows: int) -> int:
+    """
+    `rows` codes that are not in the seeded directory: the same seed continued past
+    `size`, bank codes keep counting up from the last seeded bank
+    """
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=CSV_HEADER)
+        writer.writeheader()
+        for row in islice(generate_directory(size + rows, seed), size, None):
+            writer.writerow(row)
+            written += 1
+    return written
+
+def _engine():
+    """
+    An engine of its own for the benchmark. pysqlite leaves BEGIN to the driver, which
+    skips it before SAVEPOINTs, so on SQLite transactions are started explicitly and the
+    final rollback really undoes the run.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app.backend import is_postgres
+    from app.database import DATABASE_URL, engine_options
+
+    engine = create_async_engine(DATABASE_URL, **engine_options())
+    if not is_postgres(engine):
+        @event.listens_for(engine.sync_engine, "connect")
+        def connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine.sync_engine, "begin")
+        def begin(connection):
+            connection.exec_driver_sql("BEGIN")
+    return engine
+
+async def _rolled_back(engine, run: Callable[[object], Awaitable[None]]) -> float:
+    """
+    Times `run(session)` inside a transaction that is rolled back afterwards, so every
+    repetition starts from the seeded database and leaves it as it was. The code under
+    test commits as usual, its commits release savepoints.
+    """
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        try:
+            async with AsyncSession(
+                bind=connection, expire_on_commit=False, join_transaction_mode="create_savepoint"
+            ) as session:
+                started = time.perf_counter()
+                await run(session)
+                return time.perf_counter() - started
+        finally:
+            await transaction.rollback()
+
+async def run_import(size: int, seed: int = 0, rows: int = 10000, repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    CSV import and import-job batches writing `rows` new codes into the database seeded
+    with `size` codes, median time per row over `repeat` runs
+    """
+    from app.imports import _open_reader, _parse_batch, import_runner
+    from app.models import ImportJob
+    from app.utils import import_swift_codes_from_csv
+
+    async def csv_import(session):
+        await import_swift_codes_from_csv(session, path)
+
+    async def job_batches(session):
+        # ImportRunner._import on the benchmark's session: parse in a thread, one commit per batch
+        job = ImportJob(status="running", rows_processed=0, rows_rejected=0, rows_inserted=0, rows_updated=0)
+        session.add(job)
+        await session.commit()
+        csvfile, reader = await asyncio.to_thread(_open_reader, path)
+        try:
+            while True:
+                read, records = await asyncio.to_thread(_parse_batch, reader, import_runner.batch_size)
+                if not read:
+                    break
+                await import_runner._commit_batch(session, job.id, read, records)
+        finally:
+            csvfile.close()
+
+    benchmarks = {
+        "import/csv_import_per_row": csv_import,
+        f"import/job_batches{import_runner.batch_size}_per_row": job_batches,
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "new_codes.csv")
+        rows = _new_rows_csv(path, size, seed, rows)
+        engine = _engine()
+        try:
+            for key, run in benchmarks.items():
+                await _rolled_back(engine, run)  # warm up caches and prepared statements
+                per_op = statistics.median([await _rolled_back(engine, run) / rows for _ in range(repeat)])
+                results[key] = {"per_op_us": per_op * 1e6, "ops_per_s": 1 / per_op if per_op else 0.0}
+                print(f"{key:50} {results[key]['per_op_us']:10.3f} us/op  {results[key]['ops_per_s']:14.1f} ops/s")
+        finally:
+            await engine.dispose()
+    return results
@@ -0,0 +1,160 @@
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Tuple
+
+import httpx
+
+from .results import latency_summary
+
+# Scenario name -> builds (method, url, kwargs) for one request from the sampled codes
+Scenario = Callable[[random.Random, Dict[str, List[str]]], Tuple[str, str, dict]]
+
+BATCH_GET_SIZE = 50
+
+SCENARIOS: Dict[str, Scenario] = {
+    "get_headquarter": lambda rng, codes: (
+        "GET", f"/api/v1/swift-codes/{rng.choice(codes['headquarters'])}", {}
+    ),
+    "get_branch": lambda rng, codes: (
+        "GET", f"/api/v1/swift-codes/{rng.choice(codes['branches'])}", {}
+    ),
+    "country_page": lambda rng, codes: (
+        "GET", f"/api/v1/swift-codes/country/{rng.choice(codes['countries'])}", {"params": {"limit": 100}}
+    ),
+    "country_ndjson": lambda rng, codes: (
+        "GET", f"/api/v1/swift-codes/country/{rng.choice(codes['countries'])}",
+        {"params": {"limit": 1000}, "headers": {"Accept": "application/x-ndjson"}}
+    ),
+    "batch_get": lambda rng, codes: (
+        "POST", "/api/v1/swift-codes:batchGet",
+        {"json": {"swiftCodes": rng.sample(codes["headquarters"], min(BATCH_GET_SIZE, len(codes["headquarters"])))}}
+    ),
+}
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    codes: Dict[str, List[str]],
+    concurrency: int,
+    requests: int,
+    warmup: int = 0,
+    seed: int = 0
+) -> Dict[str, float]:
+    """
+    Sends `requests` requests from `concurrency` concurrent workers and summarizes their
+    latencies. `warmup` requests are sent first and left out of the numbers.
+    """
+    rng = random.Random(seed)
+    plan = [scenario(rng, codes) for _ in range(warmup + requests)]
+    latencies: List[float] = []
+    errors = 0
+    position = 0
+
+    async def worker(record: bool, stop: int):
+        nonlocal position, errors
+        while position < stop:
+            method, url, kwargs = plan[position]
+            position += 1
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            await response.aread()
+            elapsed = time.perf_counter() - started
+            if record:
+                latencies.append(elapsed)
+                if response.status_code >= 400:
+                    errors += 1
+
+    if warmup:
+        await asyncio.gather(*(worker(False, warmup) for _ in range(concurrency)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(True, warmup + requests) for _ in range(concurrency)))
+    wall_time = time.perf_counter() - started
+
+    summary = latency_summary(latencies, wall_time)
+    summary["errors"] = errors
+    return summary
+
+@asynccontextmanager
+async def inprocess_client() -> AsyncIterator[httpx.AsyncClient]:
+    """The app driven through ASGI in this process, startup and shutdown included"""
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            yield client
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@asynccontextmanager
+async def uvicorn_client(concurrency: int, workers: int = 1, startup_timeout: float = 60) -> AsyncIterator[httpx.AsyncClient]:
+    """The app served by a uvicorn subprocess on a free local port, environment passed through"""
+    port = _free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning", "--no-access-log"
+        ],
+        env=dict(os.environ)
+    )
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+            deadline = time.monotonic() + startup_timeout
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+                try:
+                    if (await client.get("/api/health/ready")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"uvicorn not ready after {startup_timeout}s")
+                await asyncio.sleep(0.2)
+            yield client
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+async def run_load(
+    codes: Dict[str, List[str]],
+    mode: str,
+    concurrency_levels: List[int],
+    scenarios: List[str],
+    requests: int,
+    warmup: int,
+    workers: int = 1
+) -> Dict[str, Dict[str, float]]:
+    """Every scenario at every concurrency level, keyed 'load/<mode>/<scenario>/c<concurrency>'"""
+    results = {}
+    for concurrency in concurrency_levels:
+        if mode == "uvicorn":
+            client_context = uvicorn_client(concurrency, workers)
+        else:
+            client_context = inprocess_client()
+
+        async with client_context as client:
+            for name in scenarios:
+                key = f"load/{mode}/{name}/c{concurrency}"
+                results[key] = await run_scenario(client, SCENARIOS[name], codes, concurrency, requests, warmup)
+                print(
+                    f"{key:50} p50 {results[key]['p50_ms']:8.2f} ms  p95 {results[key]['p95_ms']:8.2f} ms  "
+                    f"p99 {results[key]['p99_ms']:8.2f} ms  {results[key]['throughput_rps']:9.1f} req/s  "
+                    f"errors {results[key]['errors']}"
+                )
+    return results
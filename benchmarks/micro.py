@@ -0,0 +1,116 @@
+import csv
+import io
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from .data import CSV_HEADER, generate_directory
+
+def measure(fn: Callable[[], None], ops_per_call: int, repeat: int = 5, min_time: float = 0.2) -> Dict[str, float]:
+    """
+    Calls `fn` in loops of at least `min_time` seconds, `repeat` times, and reports the
+    median time per operation (a call performs `ops_per_call` operations)
+    """
+    fn()  # warm up caches and lazy imports
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - started >= min_time:
+            break
+        loops *= 2
+
+    per_op = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        per_op.append((time.perf_counter() - started) / (loops * ops_per_call))
+
+    median = statistics.median(per_op)
+    return {"per_op_us": median * 1e6, "ops_per_s": 1 / median if median else 0.0}
+
+def _csv_text(rows: int) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_HEADER)
+    writer.writeheader()
+    writer.writerows(generate_directory(rows))
+    return buffer.getvalue()
+
+def run_micro(rows: int = 10000, country_size: int = 1000, repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    CSV row parsing, response serialization and snapshot indexing, no database needed.
+    Database writes of the importers are timed by benchmarks.imports.
+    """
+    from app.utils import _csv_reader, _normalize_row
+    from app.cache import DirectoryRecord, DirectorySnapshot
+    from app.encoding import encode_basic, encode_country
+    from app.schemas import SwiftCodeBasic, CountrySwiftCodesResponse
+
+    csv_text = _csv_text(rows)
+    normalized = [_normalize_row(row) for row in _csv_reader(io.StringIO(csv_text))]
+    records: List[DirectoryRecord] = [DirectoryRecord.from_model(_Row(r)) for r in normalized]
+    country = records[:country_size]
+
+    def csv_normalize():
+        for row in _csv_reader(io.StringIO(csv_text)):
+            _normalize_row(row)
+
+    def pydantic_basic():
+        for record in country:
+            SwiftCodeBasic(
+                swiftCode=record.swift_code,
+                bankName=record.bank_name,
+                address=record.address,
+                countryISO2=record.country_iso2,
+                isHeadquarter=record.is_headquarter
+            ).model_dump_json()
+
+    def orjson_basic():
+        for record in country:
+            encode_basic(record)
+
+    def pydantic_country():
+        CountrySwiftCodesResponse(
+            countryISO2="XX",
+            countryName="BENCHMARK",
+            swiftCodes=[
+                SwiftCodeBasic(
+                    swiftCode=r.swift_code,
+                    bankName=r.bank_name,
+                    address=r.address,
+                    countryISO2=r.country_iso2,
+                    isHeadquarter=r.is_headquarter
+                )
+                for r in country
+            ]
+        ).model_dump_json()
+
+    def orjson_country():
+        # Fragments cached on the records, as on the snapshot path
+        encode_country("XX", "BENCHMARK", country)
+
+    def snapshot_build():
+        DirectorySnapshot(records, fingerprint=())
+
+    benchmarks = {
+        "micro/csv_normalize_row": (csv_normalize, rows),
+        "micro/serialize_basic_pydantic": (pydantic_basic, len(country)),
+        "micro/serialize_basic_orjson": (orjson_basic, len(country)),
+        f"micro/serialize_country{country_size}_pydantic": (pydantic_country, 1),
+        f"micro/serialize_country{country_size}_orjson": (orjson_country, 1),
+        "micro/snapshot_build_per_record": (snapshot_build, len(records)),
+    }
+
+    results = {}
+    for key, (fn, ops) in benchmarks.items():
+        results[key] = measure(fn, ops, repeat)
+        print(f"{key:50} {results[key]['per_op_us']:10.3f} us/op  {results[key]['ops_per_s']:14.1f} ops/s")
+    return results
+
+class _Row:
+    """Attribute access over a normalized CSV row, the shape DirectoryRecord.from_model reads"""
+
+    def __init__(self, values: dict):
+        self.__dict__.update(values)
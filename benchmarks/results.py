@@ -0,0 +1,83 @@
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+def latency_summary(latencies: List[float], wall_time: float) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": (ordered[-1] if ordered else 0.0) * 1000,
+        "throughput_rps": len(ordered) / wall_time if wall_time else 0.0,
+    }
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save(path: str, results: Dict[str, Dict[str, float]], parameters: Dict[str, Any]):
+    """Writes results plus enough context (revision, interpreter, settings) to compare runs later"""
+    document = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "parameters": parameters,
+        },
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as output:
+        json.dump(document, output, indent=2, sort_keys=True)
+    print(f"Results written to {path}")
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as source:
+        return json.load(source)
+
+# Metrics compared against the baseline and whether a larger value is better
+COMPARED_METRICS = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "throughput_rps": True,
+    "per_op_us": False,
+}
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.10) -> List[str]:
+    """
+    Prints current vs baseline for every benchmark present in both and returns the
+    regressions, i.e. metrics that got worse by more than `tolerance` (a fraction)
+    """
+    regressions = []
+    for key in sorted(set(current["results"]) & set(baseline["results"])):
+        now, before = current["results"][key], baseline["results"][key]
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if metric not in now or metric not in before or not before[metric]:
+                continue
+            change = (now[metric] - before[metric]) / before[metric]
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > tolerance else ""
+            print(f"{key:50} {metric:15} {before[metric]:12.3f} -> {now[metric]:12.3f} {change:+8.1%} {flag}")
+            if flag:
+                regressions.append(f"{key} {metric} {change:+.1%}")
+    return regressions
@@ -1,7 +1,12 @@
+import asyncio
 import pytest
+import json
 from httpx import AsyncClient
+from app import database, metrics, services
+from app.admission import admission
 from app.models import SwiftCode
 
+
 @pytest.mark.asyncio
 async def test_get_swift_code(Client: AsyncClient, PopulatedDb): 
     """Test GET /swift-codes/{swift_code} endpoint"""
@@ -11,6 +16,7 @@ async def test_get_swift_code(Client: AsyncClient, PopulatedDb):
     assert data["swiftCode"] == "BOFAUS3NXXX"
     assert data["isHeadquarter"] is True
 
+
 async def test_create_swift_code(Client: AsyncClient):
     new_code = {
         "swift_code": "TESTGB2LXXX",  
@@ -21,4 +27,305 @@ async def test_create_swift_code(Client: AsyncClient):
         "is_headquarter": True
     }
     response = await Client.post("/api/v1/swift-codes", json=new_code)
-    assert response.status_code == 201
\ No newline at end of file
+    assert response.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_batch_get_swift_codes(Client: AsyncClient, PopulatedDb):
+    """Test POST /swift-codes:batchGet returns found and missing codes together"""
+    response = await Client.post(
+        "/api/v1/swift-codes:batchGet",
+        json={"swiftCodes": ["BOFAUS3NXXX", "UNKNOWNXXXX"]}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [c["swiftCode"] for c in data["swiftCodes"]] == ["BOFAUS3NXXX"]
+    assert data["swiftCodes"][0]["branches"][0]["swiftCode"] == "BOFAUS3NBOS"
+    assert data["missing"] == ["UNKNOWNXXXX"]
+
+
+@pytest.mark.asyncio
+async def test_get_country_codes_paginated(Client: AsyncClient, PopulatedDb):
+    """Test keyset pagination and NDJSON streaming of /swift-codes/country/{country_code}"""
+    response = await Client.get("/api/v1/swift-codes/country/US?limit=1")
+    assert response.status_code == 200
+    assert [c["swiftCode"] for c in response.json()["swiftCodes"]] == ["BOFAUS3NBOS"]
+    assert "after=BOFAUS3NBOS" in response.headers["link"]
+
+    response = await Client.get("/api/v1/swift-codes/country/US?limit=1&after=BOFAUS3NBOS")
+    assert [c["swiftCode"] for c in response.json()["swiftCodes"]] == ["BOFAUS3NXXX"]
+    assert "link" not in response.headers
+
+    response = await Client.get(
+        "/api/v1/swift-codes/country/US",
+        headers={"Accept": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert [json.loads(line)["swiftCode"] for line in lines] == ["BOFAUS3NBOS", "BOFAUS3NXXX"]
+
+
+@pytest.mark.asyncio
+async def test_batch_create_swift_codes(Client: AsyncClient, PopulatedDb):
+    """Test POST /swift-codes:batchCreate reports a status per item"""
+    new_code = {
+        "swiftCode": "TESTGB2LXXX",
+        "bankName": "TEST BANK",
+        "address": "123 TEST STREET, LONDON",
+        "countryISO2": "GB",
+        "countryName": "UNITED KINGDOM",
+        "isHeadquarter": True
+    }
+    existing_code = {**new_code, "swiftCode": "BOFAUS3NXXX", "countryISO2": "US"}
+    response = await Client.post(
+        "/api/v1/swift-codes:batchCreate",
+        json={"swiftCodes": [new_code, existing_code]}
+    )
+    assert response.status_code == 200
+    assert response.json()["results"] == [
+        {"swiftCode": "TESTGB2LXXX", "status": "created"},
+        {"swiftCode": "BOFAUS3NXXX", "status": "exists"}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_country_codes_conditional(Client: AsyncClient, PopulatedDb):
+    """Test ETag on /swift-codes/country/{country_code} and 304 on If-None-Match"""
+    response = await Client.get("/api/v1/swift-codes/country/US")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    response = await Client.get("/api/v1/swift-codes/country/US", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+@pytest.mark.asyncio
+async def test_get_swift_code_conditional(Client: AsyncClient, PopulatedDb):
+    """The code's ETag follows its stored country, unknown codes are 404 even for If-None-Match: *"""
+    # Positions 5-6 say GB, the row says PL
+    code = {
+        "swiftCode": "TESTGB2LXXX",
+        "bankName": "TEST BANK",
+        "address": "123 TEST STREET, LONDON",
+        "countryISO2": "PL",
+        "countryName": "POLAND",
+        "isHeadquarter": True
+    }
+    assert (await Client.post("/api/v1/swift-codes:batchCreate", json={"swiftCodes": [code]})).status_code == 200
+    etag = (await Client.get("/api/v1/swift-codes/TESTGB2LXXX")).headers["etag"]
+    assert (await Client.get("/api/v1/swift-codes/TESTGB2LXXX", headers={"If-None-Match": etag})).status_code == 304
+
+    await Client.post(
+        "/api/v1/swift-codes:batchCreate",
+        params={"onConflict": "update"},
+        json={"swiftCodes": [{**code, "bankName": "RENAMED BANK"}]}
+    )
+    response = await Client.get("/api/v1/swift-codes/TESTGB2LXXX", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["bankName"] == "RENAMED BANK"
+
+    response = await Client.get("/api/v1/swift-codes/UNKNOWNXXXX", headers={"If-None-Match": "*"})
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_moving_code_changes_both_country_etags(Client: AsyncClient, PopulatedDb):
+    """A code rewritten under another country invalidates the listing it left, too"""
+    us_etag = (await Client.get("/api/v1/swift-codes/country/US")).headers["etag"]
+
+    response = await Client.post(
+        "/api/v1/swift-codes:batchCreate",
+        params={"onConflict": "update"},
+        json={"swiftCodes": [{
+            "swiftCode": "BOFAUS3NBOS",
+            "bankName": "BANK OF AMERICA",
+            "address": "1 LONDON WALL, LONDON",
+            "countryISO2": "GB",
+            "countryName": "UNITED KINGDOM",
+            "isHeadquarter": False
+        }]}
+    )
+    assert response.json()["results"][0]["status"] == "updated"
+
+    response = await Client.get("/api/v1/swift-codes/country/US", headers={"If-None-Match": us_etag})
+    assert response.status_code == 200
+    assert [c["swiftCode"] for c in response.json()["swiftCodes"]] == ["BOFAUS3NXXX"]
+    response = await Client.get("/api/v1/swift-codes/country/GB")
+    assert [c["swiftCode"] for c in response.json()["swiftCodes"]] == ["BOFAUS3NBOS"]
+
+
+@pytest.mark.asyncio
+async def test_health_probes(Client: AsyncClient, TestApp, DbSession, monkeypatch):
+    """Test liveness is always up and readiness waits for the startup warm-up"""
+    # The readiness ping goes to the app's engine, point it at the test database
+    monkeypatch.setattr(database, "engine", DbSession.bind)
+    response = await Client.get("/api/health/live")
+    assert response.status_code == 200
+
+    monkeypatch.setattr(TestApp.state, "ready", False, raising=False)
+    response = await Client.get("/api/health/ready")
+    assert response.status_code == 503
+
+    TestApp.state.ready = True
+    response = await Client.get("/api/health/ready")
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_streams_hold_their_admission_slot(Client: AsyncClient, PopulatedDb, monkeypatch):
+    """Export and NDJSON bodies are sent while still counting against the read budget"""
+    budget = admission.budgets["read"]
+    idle = budget.active
+    seen = []
+
+    async def stream_export(db, format):
+        seen.append(budget.active)
+        yield b"{}\n"
+
+    async def stream_country(db, country_code, limit, after):
+        for _ in range(2):
+            seen.append(budget.active)
+            yield b"{}\n"
+
+    monkeypatch.setattr(services, "stream_directory_export", stream_export)
+    monkeypatch.setattr(services, "stream_swift_codes_by_country", stream_country)
+
+    assert (await Client.get("/api/v1/swift-codes/export")).status_code == 200
+    response = await Client.get("/api/v1/swift-codes/country/US", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert seen == [idle + 1] * 3
+    assert budget.active == idle
+
+
+@pytest.mark.asyncio
+async def test_metrics(Client: AsyncClient, PopulatedDb):
+    """Test /metrics reports request latency by route template"""
+    await Client.get("/api/v1/swift-codes/BOFAUS3NXXX")
+
+    response = await Client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/swift-codes/{swift_code}",status="200"}' in response.text
+    assert "# TYPE db_pool_saturation gauge" in response.text
+
+
+@pytest.mark.asyncio
+async def test_metrics_disabled(Client: AsyncClient, monkeypatch):
+    """Test /metrics is not served with METRICS_ENABLED=false"""
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    response = await Client.get("/metrics")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_search_swift_codes(Client: AsyncClient, PopulatedDb):
+    """Test /swift-codes/search by code prefix and misspelled bank name"""
+    response = await Client.get("/api/v1/swift-codes/search", params={"q": "BOFAUS3NB"})
+    assert response.status_code == 200
+    assert [r["swiftCode"] for r in response.json()["results"]] == ["BOFAUS3NBOS"]
+
+    response = await Client.get("/api/v1/swift-codes/search", params={"q": "amerca", "country": "US"})
+    assert response.status_code == 200
+    assert {r["swiftCode"] for r in response.json()["results"]} == {"BOFAUS3NXXX", "BOFAUS3NBOS"}
+
+    response = await Client.get("/api/v1/swift-codes/search", params={"q": "amerca", "country": "PL"})
+    assert response.json()["results"] == []
+
+
+@pytest.mark.asyncio
+async def test_validate_swift_codes(Client: AsyncClient, PopulatedDb):
+    """Test :validate reports structure errors, country mismatches, unknown and active codes"""
+    response = await Client.post(
+        "/api/v1/swift-codes:validate",
+        json={"swiftCodes": [
+            "bofaus3nxxx",
+            {"swiftCode": "BOFAUS3NBOS", "countryISO2": "PL"},
+            "BOFA-US3N",
+            "ZZZZUS3NXXX"
+        ]}
+    )
+    assert response.status_code == 200
+    assert [(r["swiftCode"], r["status"]) for r in response.json()["results"]] == [
+        ("BOFAUS3NXXX", "active"),
+        ("BOFAUS3NBOS", "country_mismatch"),
+        ("BOFA-US3N", "invalid_format"),
+        ("ZZZZUS3NXXX", "not_found")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_swift_code_changes(Client: AsyncClient):
+    """Test /swift-codes/changes returns writes after the cursor in order"""
+    for code in ("TESTGB2LXXX", "TESTGB2LMAN"):
+        response = await Client.post("/api/v1/swift-codes", json={
+            "swiftCode": code,
+            "bankName": "TEST BANK",
+            "address": "123 TEST STREET, LONDON",
+            "countryISO2": "GB",
+            "countryName": "UNITED KINGDOM",
+            "isHeadquarter": code.endswith("XXX")
+        })
+        assert response.status_code == 201
+    assert (await Client.delete("/api/v1/swift-codes/TESTGB2LMAN")).status_code == 200
+
+    response = await Client.get("/api/v1/swift-codes/changes", params={"since": 0, "limit": 2})
+    assert response.status_code == 200
+    first = response.json()
+    assert [(c["swiftCode"], c["operation"]) for c in first["changes"]] == [
+        ("TESTGB2LXXX", "insert"),
+        ("TESTGB2LMAN", "insert")
+    ]
+    assert first["changes"][0]["record"]["bankName"] == "TEST BANK"
+    assert first["changes"][1]["record"] is None
+    assert first["hasMore"] is True
+
+    response = await Client.get("/api/v1/swift-codes/changes", params={"since": first["nextSince"]})
+    rest = response.json()
+    assert [(c["swiftCode"], c["operation"]) for c in rest["changes"]] == [("TESTGB2LMAN", "delete")]
+    assert rest["hasMore"] is False
+
+
+@pytest.mark.asyncio
+async def test_export_swift_codes(Client: AsyncClient, PopulatedDb):
+    """Test /swift-codes/export streams the importer's CSV columns, gzip-compressed on request"""
+    response = await Client.get(
+        "/api/v1/swift-codes/export",
+        params={"format": "csv"},
+        headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    lines = response.text.splitlines()
+    assert lines[0] == "COUNTRY ISO2 CODE,SWIFT CODE,CODE TYPE,NAME,ADDRESS,TOWN NAME,COUNTRY NAME,TIME ZONE"
+    assert [line.split(",")[1:3] for line in lines[1:]] == [
+        ["BOFAUS3NBOS", "BRANCH"],
+        ["BOFAUS3NXXX", "HEADQUARTER"]
+    ]
+
+    response = await Client.get("/api/v1/swift-codes/export")
+    assert [json.loads(line)["swiftCode"] for line in response.text.splitlines()] == ["BOFAUS3NBOS", "BOFAUS3NXXX"]
+
+
+@pytest.mark.asyncio
+async def test_import_csv_upload(Client: AsyncClient, PopulatedDb):
+    """Test POST /imports runs the upload in the background and reports progress"""
+    csv_file = (
+        "COUNTRY ISO2 CODE,SWIFT CODE,CODE TYPE,NAME,ADDRESS,TOWN NAME,COUNTRY NAME,TIME ZONE\n"
+        "PL,TESTPLPWXXX,HEADQUARTER,TEST BANK,UL. TESTOWA 1,WARSZAWA,POLAND,Europe/Warsaw\n"
+        "PL,TESTPL,HEADQUARTER,BROKEN ROW,UL. TESTOWA 2,WARSZAWA,POLAND,Europe/Warsaw\n"
+    )
+    response = await Client.post("/api/v1/imports", files={"file": ("codes.csv", csv_file, "text/csv")})
+    assert response.status_code == 202
+    location = response.headers["location"]
+
+    for _ in range(50):
+        job = (await Client.get(location)).json()
+        if job["status"] not in ("queued", "running"):
+            break
+        await asyncio.sleep(0.1)
+    assert job["status"] == "succeeded"
+    assert (job["rowsProcessed"], job["rowsRejected"], job["rowsInserted"]) == (2, 1, 1)
+
+    response = await Client.get("/api/v1/swift-codes/TESTPLPWXXX")
+    assert response.status_code == 200
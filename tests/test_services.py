@@ -1,9 +1,27 @@
+import asyncio
+import csv
+import uuid
 import pytest
-from app.services import get_swift_code, create_swift_code
+from datetime import datetime, timedelta
+from app import services, versions
+from app.cache import SwiftCodeCache
+from app.directory_file import MappedDirectory
+from app.services import get_swift_code, create_swift_code, delete_swift_code
 from app.schemas import SwiftCodeCreate, SwiftCodeWithBranches
-from app.models import SwiftCode
+from app.models import ImportJob, SwiftCode, SwiftCodeArchive
+from app.imports import ImportRunner
+from app.maintenance import purge_soft_deleted
+from app.admission import Budget
+from app.backend import is_postgres
+from app.export import CSV_COLUMNS
+from app.utils import bulk_load_swift_codes_from_csv, sync_swift_codes_from_csv
+from app.database import Base, engine_options
+from app.profiling import SlowQueryLog
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from fastapi import HTTPException
 
+
 @pytest.mark.asyncio
 async def test_get_swift_code_service(DbSession, PopulatedDb):  
     """Test get_swift_code service function"""
@@ -19,6 +37,7 @@ async def test_get_swift_code_service(DbSession, PopulatedDb):
         await get_swift_code(DbSession, "NONEXISTENT")
     assert exc_info.value.status_code == 404
 
+
 async def test_create_swift_code_service(DbSession):
     new_code = SwiftCodeCreate(
         swift_code="TESTGB2LXXX",
@@ -39,4 +58,276 @@ async def test_create_swift_code_service(DbSession):
     # Test duplicate creation
     with pytest.raises(HTTPException) as exc_info:
         await create_swift_code(DbSession, new_code)
-    assert exc_info.value.status_code == 400
\ No newline at end of file
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_swift_code_from_snapshot(DbSession, PopulatedDb, monkeypatch):
+    """Lookups served from the in-process snapshot match the DB path"""
+    monkeypatch.setattr(services, "swift_code_cache", SwiftCodeCache(enabled=True, ttl=60))
+
+    swift_code = await get_swift_code(DbSession, "BOFAUS3NXXX")
+    assert [b.swiftCode for b in swift_code.branches] == ["BOFAUS3NBOS"]
+
+    await delete_swift_code(DbSession, "BOFAUS3NBOS")
+    swift_code = await get_swift_code(DbSession, "BOFAUS3NXXX")
+    assert swift_code.branches == []
+
+
+@pytest.mark.asyncio
+async def test_get_swift_code_branches_by_bank_code(DbSession, PopulatedDb):
+    """HQ lookup returns branches sharing the 8-character bank code, branch lookup returns none"""
+    headquarter = await get_swift_code(DbSession, "BOFAUS3NXXX")
+    assert [b.swiftCode for b in headquarter.branches] == ["BOFAUS3NBOS"]
+
+    branch = await get_swift_code(DbSession, "BOFAUS3NBOS")
+    assert branch.isHeadquarter is False
+    assert branch.branches == []
+
+
+@pytest.mark.asyncio
+async def test_get_swift_code_json_matches_schema(DbSession, PopulatedDb):
+    """The pre-encoded fast path produces the same document as the Pydantic response model"""
+    model = await get_swift_code(DbSession, "BOFAUS3NXXX")
+    content = await services.get_swift_code_json(DbSession, "BOFAUS3NXXX")
+    assert content == model.model_dump_json().encode()
+
+
+@pytest.mark.asyncio
+async def test_search_swift_codes_snapshot_matches_database(DbSession, PopulatedDb, monkeypatch):
+    """The in-process n-gram index ranks like the database search, pg_trgm on PostgreSQL and a scored scan on SQLite"""
+    from_database = await services.search_swift_codes(DbSession, "amerca bofaus3nb")
+
+    monkeypatch.setattr(services, "swift_code_cache", SwiftCodeCache(enabled=True, ttl=60))
+    from_snapshot = await services.search_swift_codes(DbSession, "amerca bofaus3nb")
+
+    assert [r.swiftCode for r in from_database.results] == ["BOFAUS3NBOS"]
+    assert [r.swiftCode for r in from_snapshot.results] == ["BOFAUS3NBOS"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_coalesced(DbSession, PopulatedDb):
+    """Concurrent identical lookups share one result, errors reach every caller"""
+    results = await asyncio.gather(*(get_swift_code(DbSession, "BOFAUS3NXXX") for _ in range(10)))
+    assert all(r is results[0] for r in results)
+
+    missing = await asyncio.gather(
+        *(get_swift_code(DbSession, "XXXXXXXXXXX") for _ in range(3)),
+        return_exceptions=True
+    )
+    assert all(isinstance(e, HTTPException) and e.status_code == 404 for e in missing)
+    assert services.lookups.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_lookups_on_different_engines_are_not_shared(DbSession, PopulatedDb, TestData, tmp_path):
+    """A lookup pinned to the primary never joins one running on a lagging replica"""
+    replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    try:
+        async with replica.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncSession(bind=replica) as session:
+            session.add_all(SwiftCode(**{k: v for k, v in data.items() if hasattr(SwiftCode, k)}) for data in TestData)
+            await session.flush()
+            await session.execute(
+                update(SwiftCode).where(SwiftCode.swift_code == "BOFAUS3NXXX").values(bank_name="STALE NAME")
+            )
+            await session.commit()
+
+        async with AsyncSession(bind=replica) as replica_session:
+            from_replica, from_primary = await asyncio.gather(
+                get_swift_code(replica_session, "BOFAUS3NXXX"),
+                get_swift_code(DbSession, "BOFAUS3NXXX")
+            )
+        assert from_replica.bankName == "STALE NAME"
+        assert from_primary.bankName == "BANK OF AMERICA"
+    finally:
+        await replica.dispose()
+
+
+@pytest.mark.asyncio
+async def test_coalesced_lookups_fit_a_one_connection_pool(DbSession, PopulatedDb, TestData, tmp_path):
+    """A lookup hands its connection back before joining the shared call, one pooled connection serves them all"""
+    url = DbSession.bind.url.render_as_string(hide_password=False)
+    if not is_postgres(DbSession):
+        # :memory: shares a single connection, a file database has a real pool
+        url = f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}"
+    engine = create_async_engine(url, pool_size=1, max_overflow=0, pool_timeout=2)
+    try:
+        if not is_postgres(DbSession):
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            async with AsyncSession(bind=engine) as session:
+                session.add_all(SwiftCode(**{k: v for k, v in data.items() if hasattr(SwiftCode, k)}) for data in TestData)
+                await session.commit()
+
+        async def lookup():
+            # The route's order: country version first, then the body
+            async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+                await versions.get_country_version(session, "US")
+                return await services.get_swift_code_json(session, "BOFAUS3NXXX")
+
+        results = await asyncio.gather(*(lookup() for _ in range(6)))
+        assert len(set(results)) == 1
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_get_swift_code_from_directory_file(DbSession, PopulatedDb, monkeypatch, tmp_path):
+    """Lookups served from the memory-mapped directory file match the DB path"""
+    expected = await services.get_swift_code_json(DbSession, "BOFAUS3NXXX")
+
+    directory = MappedDirectory(str(tmp_path / "directory.bin"), check_interval=0)
+    await directory.ensure_current(DbSession)
+    monkeypatch.setattr(services, "mapped_directory", directory)
+
+    assert await services.get_swift_code_json(DbSession, "BOFAUS3NXXX") == expected
+    page, _ = await services.get_swift_codes_page(DbSession, "US", 10)
+    assert [c.swiftCode for c in page.swiftCodes] == ["BOFAUS3NBOS", "BOFAUS3NXXX"]
+
+
+@pytest.mark.asyncio
+async def test_purge_soft_deleted_archives_old_codes(DbSession, PopulatedDb):
+    """Codes soft-deleted long enough ago move to the archive, recent deletions stay"""
+    await delete_swift_code(DbSession, "BOFAUS3NBOS")
+    await delete_swift_code(DbSession, "BOFAUS3NXXX")
+    await DbSession.execute(
+        update(SwiftCode)
+        .where(SwiftCode.swift_code == "BOFAUS3NBOS")
+        .values(updated_at=datetime.utcnow() - timedelta(days=40))
+    )
+    await DbSession.commit()
+
+    summary = await purge_soft_deleted(DbSession, older_than_days=30, batch_size=1)
+    assert summary == {"archived": 1, "batches": 1}
+
+    remaining = (await DbSession.execute(select(SwiftCode.swift_code))).scalars().all()
+    archived = (await DbSession.execute(select(SwiftCodeArchive.swift_code))).scalars().all()
+    assert remaining == ["BOFAUS3NXXX"]
+    assert archived == ["BOFAUS3NBOS"]
+
+
+@pytest.mark.asyncio
+async def test_admission_budget_sheds_over_capacity():
+    """Requests beyond concurrency wait in the queue, beyond the queue or the deadline they get 503"""
+    budget = Budget("test", concurrency=1, queue_size=1, timeout=0.1)
+    await budget.acquire()
+
+    queued = asyncio.ensure_future(budget.acquire())
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException) as exc_info:
+        await budget.acquire()
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"] == "1"
+
+    # The released slot goes to the queued request
+    budget.release()
+    await queued
+    assert budget.active == 1
+
+    with pytest.raises(HTTPException):
+        await budget.acquire()
+    budget.release()
+    assert budget.active == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_query_log_groups_statements_and_captures_plans(DbSession):
+    """Slow statements are grouped by normalized text, sampled SELECTs keep their plan"""
+    url = DbSession.bind.url.render_as_string(hide_password=False)
+    engine = create_async_engine(url, **engine_options(url))
+    log = SlowQueryLog(enabled=True, threshold=0, size=50, explain_sample_rate=1.0)
+    log.attach(engine, "test")
+    try:
+        async with engine.connect() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            for country in ("US", "PL"):
+                await conn.execute(select(SwiftCode.swift_code).where(SwiftCode.country_iso2 == country))
+    finally:
+        await engine.dispose()
+
+    lookups = [e for e in log.entries() if e.statement.startswith("SELECT swift_codes.swift_code FROM")]
+    assert len(lookups) == 1
+    assert lookups[0].statement.endswith("WHERE swift_codes.country_iso2 = ?")
+    assert lookups[0].calls == 2
+    assert lookups[0].plan and lookups[0].plan_captured_at is not None
+
+
+def _write_directory_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(rows)
+    return str(path)
+
+
+@pytest.mark.asyncio
+async def test_bulk_load_counts_inserts_updates_rejects_and_duplicates(DbSession, PopulatedDb, tmp_path):
+    """COPY into staging, then one ON CONFLICT merge; rejected rows and duplicate codes are reported apart"""
+    if not is_postgres(DbSession):
+        pytest.skip("COPY needs PostgreSQL")
+    path = _write_directory_csv(tmp_path / "directory.csv", [
+        ("US", "BOFAUS3NXXX", "HEADQUARTER", "BANK OF AMERICA NA", "100 NORTH TRYON STREET", "CHARLOTTE", "UNITED STATES", ""),
+        ("PL", "TESTPLPWXXX", "HEADQUARTER", "TEST BANK", "1 MARSZALKOWSKA", "WARSZAWA", "POLAND", ""),
+        ("PL", "TESTPLPWXXX", "HEADQUARTER", "TEST BANK SA", "1 MARSZALKOWSKA", "WARSZAWA", "POLAND", ""),
+        ("PL", "TESTPL", "BRANCH", "TEST BANK", "2 MARSZALKOWSKA", "WARSZAWA", "POLAND", ""),
+    ])
+
+    summary = await bulk_load_swift_codes_from_csv(DbSession, path)
+
+    assert (summary["inserted"], summary["updated"]) == (1, 1)
+    assert (summary["total"], summary["rejected"], summary["duplicates"]) == (4, 1, 1)
+    loaded = await DbSession.execute(select(SwiftCode.bank_name).where(SwiftCode.swift_code == "TESTPLPWXXX"))
+    assert loaded.scalar_one() == "TEST BANK SA"
+
+
+@pytest.mark.asyncio
+async def test_sync_keeps_codes_of_rejected_rows(DbSession, PopulatedDb, tmp_path):
+    """Sync inserts, updates and soft-deletes missing codes, but not a code whose row failed validation"""
+    if not is_postgres(DbSession):
+        pytest.skip("COPY needs PostgreSQL")
+    DbSession.add(SwiftCode(
+        swift_code="TESTDEFFXXX", bank_name="TEST BANK", address="1 ZEIL, FRANKFURT", country_iso2="DE",
+        country_name="GERMANY", is_headquarter=True, is_active=True, code_type="headquarter"
+    ))
+    await DbSession.commit()
+    path = _write_directory_csv(tmp_path / "directory.csv", [
+        ("US", "BOFAUS3NXXX", "HEADQUARTER", "BANK OF AMERICA", "100 NORTH TRYON STREET", "CHARLOTTE NC 28255", "UNITED STATES", ""),
+        ("USA", "BOFAUS3NBOS", "BRANCH", "BANK OF AMERICA", "100 FEDERAL STREET", "BOSTON MA 02110", "UNITED STATES", ""),
+        ("PL", "TESTPLPWXXX", "HEADQUARTER", "TEST BANK", "1 MARSZALKOWSKA", "WARSZAWA", "POLAND", ""),
+    ])
+
+    summary = await sync_swift_codes_from_csv(DbSession, path)
+
+    assert (summary["inserted"], summary["updated"], summary["deleted"], summary["rejected"]) == (1, 1, 1, 1)
+    active = (await DbSession.execute(
+        select(SwiftCode.swift_code).where(SwiftCode.is_active == True).order_by(SwiftCode.swift_code)
+    )).scalars().all()
+    assert active == ["BOFAUS3NBOS", "BOFAUS3NXXX", "TESTPLPWXXX"]
+
+
+@pytest.mark.asyncio
+async def test_recover_fails_import_jobs_of_dead_workers(DbSession, tmp_path):
+    """Queued and running jobs without a recent heartbeat are failed and their uploads removed"""
+    now = datetime.utcnow()
+    stale, alive, done = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    DbSession.add_all([
+        ImportJob(id=stale, status="running", created_at=now - timedelta(hours=2), heartbeat_at=now - timedelta(hours=1)),
+        ImportJob(id=alive, status="queued", created_at=now - timedelta(hours=2), heartbeat_at=now),
+        ImportJob(id=done, status="succeeded", created_at=now - timedelta(hours=2), heartbeat_at=now - timedelta(hours=1)),
+    ])
+    await DbSession.commit()
+    for job_id in (stale, alive):
+        (tmp_path / f"{job_id}.csv").write_text("COUNTRY ISO2 CODE\n")
+
+    runner = ImportRunner(str(tmp_path), 100, heartbeat_interval=30, stale_after=300)
+    assert await runner.recover(DbSession.bind) == 1
+    assert await runner.recover(DbSession.bind) == 0
+
+    DbSession.expire_all()
+    assert (await DbSession.get(ImportJob, stale)).status == "failed"
+    assert (await DbSession.get(ImportJob, alive)).status == "queued"
+    assert (await DbSession.get(ImportJob, done)).status == "succeeded"
+    assert not (tmp_path / f"{stale}.csv").exists()
+    assert (tmp_path / f"{alive}.csv").exists()